@@ -47,9 +47,9 @@ def setup_logging():
 
 # Use @contextmanager to ensure database connections are properly closed even if exceptions occur
 @contextmanager
-def database_connection(db_path):
+def database_connection(db_path, timeout=30.0):
     """Safe database connection with proper cleanup"""
-    conn = sqlite3.connect(db_path, timeout=30.0)
+    conn = sqlite3.connect(db_path, timeout=timeout)
     try:
         # Safe performance settings (not synchronous=OFF)
         conn.execute('PRAGMA journal_mode=WAL')
@@ -63,69 +63,172 @@ def database_connection(db_path):
     finally:
         conn.close()
 
+# Columns of files besides the (dir_id, name) key, in table order
+FILE_COLUMNS = ('size', 'mtime', 'checksum', 'mount_point', 'file_type', 'extension', 'scan_time')
+
+def create_schema(conn, logger):
+    """Create the tables shared by both scanners, converting older layouts in place.
+    
+    Runs inside the caller's write transaction; the smart scanner adds its
+    own tables and triggers on top in the same transaction.
+    """
+    # Files are keyed on (dir_id, name) so each directory path is stored
+    # once instead of in every key; older path-keyed tables are converted in
+    # place. A files_legacy table means an earlier, non-transactional
+    # conversion was interrupted after moving the rows aside, so that copy
+    # is finished too.
+    legacy = 'path' in {row[1] for row in conn.execute('PRAGMA table_info(files)')}
+    unfinished = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'files_legacy'"
+    ).fetchone() is not None
+    # Per-mount triggers from earlier versions; the totals live in agg_stats
+    conn.execute('DROP TRIGGER IF EXISTS files_bi')
+    conn.execute('DROP TRIGGER IF EXISTS files_ai')
+    if legacy or unfinished:
+        logger.info("Converting files table to the (dir_id, name) layout...")
+        # Stats triggers are recreated and backfilled by the smart scanner
+        for trigger in ('files_agg_bi', 'files_agg_ai'):
+            conn.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    if legacy:
+        conn.execute('ALTER TABLE files RENAME TO files_legacy')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS directories (
+            id INTEGER PRIMARY KEY,
+            path TEXT UNIQUE
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS files (
+            dir_id INTEGER,
+            name TEXT,
+            size INTEGER,
+            mtime REAL,
+            checksum TEXT,
+            mount_point TEXT,
+            file_type TEXT,
+            extension TEXT,
+            scan_time REAL,
+            PRIMARY KEY (dir_id, name)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE VIEW IF NOT EXISTS files_by_path AS
+        SELECT d.path || '/' || f.name AS path, f.*
+        FROM files f JOIN directories d ON d.id = f.dir_id
+    ''')
+    if legacy or unfinished:
+        _copy_legacy_files(conn)
+    # Covering index for the per-mount stats queries; the per-type index
+    # from earlier versions only added write cost
+    conn.execute('DROP INDEX IF EXISTS idx_files_type_mount_size')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_files_mount_size ON files(mount_point, size)')
+    
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS scan_stats (
+            mount_point TEXT PRIMARY KEY,
+            files_scanned INTEGER,
+            bytes_scanned INTEGER,
+            start_time REAL,
+            end_time REAL
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS scanned_dirs (
+            path TEXT PRIMARY KEY,
+            mount_point TEXT,
+            scan_time REAL
+        ) WITHOUT ROWID
+    ''')
+
+def _copy_legacy_files(conn):
+    """Move the rows of files_legacy into files, then drop it.
+    
+    Path-keyed tables come in more than one shape - progressive_scanner.py
+    creates files(path, mount_point, size, mtime, scan_time) - so columns the
+    old table lacks are filled with NULL.
+    """
+    present = {row[1] for row in conn.execute('PRAGMA table_info(files_legacy)')}
+    if 'path' not in present:
+        raise sqlite3.OperationalError(
+            f"files_legacy has no path column (found {', '.join(sorted(present))}) - cannot convert it")
+    values = ', '.join(f'l.{column}' if column in present else 'NULL' for column in FILE_COLUMNS)
+    # rtrim(path, <path without slashes>) leaves everything up to the last '/'
+    conn.execute('''
+        INSERT OR IGNORE INTO directories (path)
+        SELECT DISTINCT substr(path, 1, length(rtrim(path, replace(path, '/', ''))) - 1)
+        FROM files_legacy
+    ''')
+    # Rows written after an interrupted conversion are newer and win
+    conn.execute(f'''
+        INSERT OR IGNORE INTO files (dir_id, name, {', '.join(FILE_COLUMNS)})
+        SELECT d.id, substr(l.path, length(rtrim(l.path, replace(l.path, '/', ''))) + 1), {values}
+        FROM files_legacy l
+        JOIN directories d
+          ON d.path = substr(l.path, 1, length(rtrim(l.path, replace(l.path, '/', ''))) - 1)
+    ''')
+    conn.execute('DROP TABLE files_legacy')
+
 class DatabaseManager:
     """Handles all database operations"""
     
     def __init__(self, db_path):
         self.db_path = db_path
         self.logger = logging.getLogger(__name__)
+        # Directory path -> directories.id, only for ids that have been committed
+        self._dir_ids = {}
         self._init_schema()
     
     def _init_schema(self):
         """Initialize database schema"""
-        with database_connection(self.db_path) as conn:
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS files (
-                    path TEXT PRIMARY KEY,
-                    size INTEGER,
-                    mtime REAL,
-                    checksum TEXT,
-                    mount_point TEXT,
-                    file_type TEXT,
-                    extension TEXT,
-                    scan_time REAL
-                ) WITHOUT ROWID
-            ''')
-            
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS scan_stats (
-                    mount_point TEXT PRIMARY KEY,
-                    files_scanned INTEGER,
-                    bytes_scanned INTEGER,
-                    start_time REAL,
-                    end_time REAL
-                )
-            ''')
-
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS scanned_dirs (
-                    path TEXT PRIMARY KEY,
-                    mount_point TEXT,
-                    scan_time REAL
-                ) WITHOUT ROWID
-            ''')
+        # Every container runs this at start-up, and a conversion in another
+        # one can hold the write lock for a while, so wait for it
+        with database_connection(self.db_path, timeout=600.0) as conn:
+            # The whole schema set-up is one write transaction. SQLite DDL is
+            # transactional, so a conversion either completes or leaves the
+            # old table as it was, and concurrent inits run one after another,
+            # each checking the schema only once it holds the lock.
+            conn.execute('BEGIN IMMEDIATE')
+            create_schema(conn, self.logger)
             conn.commit()
     
-    def save_files(self, file_batch):
-        """Save a batch of files safely"""
-        if not file_batch:
+    def save_files(self, file_batch, scanned_dirs=(), mount_point=None):
+        """Save a batch of files and mark the directories they came from as scanned.
+        
+        Both go into one transaction, so a directory is only recorded as
+        scanned together with its files, and a batch costs a single commit
+        rather than one more per directory.
+        """
+        if not file_batch and not scanned_dirs:
             return
             
         attempts = 0
         while attempts < 5:
             try:
                 with database_connection(self.db_path) as conn:
-                    data = [(f['path'], f['size'], f['mtime'], f.get('checksum'),
-                            f['mount_point'], f.get('file_type', 'other'),
-                            f['extension'], f['scan_time'])
-                           for f in file_batch]
+                    new_ids = {}
+                    data = []
+                    for f in file_batch:
+                        dir_path, name = os.path.split(f['path'])
+                        data.append((self._dir_id(conn, dir_path, new_ids), name,
+                                     f['size'], f['mtime'], f.get('checksum'),
+                                     f['mount_point'], f.get('file_type', 'other'),
+                                     f['extension'], f['scan_time']))
 
                     conn.executemany('''
                         INSERT OR REPLACE INTO files
-                        (path, size, mtime, checksum, mount_point, file_type, extension, scan_time)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        (dir_id, name, size, mtime, checksum, mount_point, file_type, extension, scan_time)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
                     ''', data)
+                    scan_time = time.time()
+                    conn.executemany(
+                        'INSERT OR REPLACE INTO scanned_dirs (path, mount_point, scan_time) VALUES (?, ?, ?)',
+                        [(path, mount_point, scan_time) for path in scanned_dirs]
+                    )
                     conn.commit()
+                    # Only remember ids once they are committed; a rolled back
+                    # retry could otherwise hand out an id that no longer exists
+                    self._dir_ids.update(new_ids)
                 return
             except sqlite3.OperationalError as e:
                 if 'locked' in str(e).lower():
@@ -139,29 +242,18 @@ class DatabaseManager:
                 return
         self.logger.error("Database save failed after retries")
 
-    def mark_dir_scanned(self, path, mount_point):
-        """Record that a directory has been scanned"""
-        attempts = 0
-        while attempts < 5:
-            try:
-                with database_connection(self.db_path) as conn:
-                    conn.execute(
-                        'INSERT OR REPLACE INTO scanned_dirs (path, mount_point, scan_time) VALUES (?, ?, ?)',
-                        (path, mount_point, time.time())
-                    )
-                    conn.commit()
-                return
-            except sqlite3.OperationalError as e:
-                if 'locked' in str(e).lower():
-                    attempts += 1
-                    time.sleep(0.1 * attempts)
-                    continue
-                self.logger.error(f"Failed to mark directory scanned: {e}")
-                return
-            except Exception as e:
-                self.logger.error(f"Failed to mark directory scanned: {e}")
-                return
-        self.logger.error("Failed to mark directory scanned after retries")
+    def _dir_id(self, conn, dir_path, new_ids):
+        """Look up or create the directories row for dir_path"""
+        dir_id = self._dir_ids.get(dir_path) or new_ids.get(dir_path)
+        if dir_id is None:
+            row = conn.execute(
+                'INSERT INTO directories (path) VALUES (?) ON CONFLICT(path) DO NOTHING RETURNING id',
+                (dir_path,)
+            ).fetchone()
+            if row is None:
+                row = conn.execute('SELECT id FROM directories WHERE path=?', (dir_path,)).fetchone()
+            dir_id = new_ids[dir_path] = row[0]
+        return dir_id
 
     def get_scanned_dirs(self, mount_point):
         """Get set of directories already scanned for a mount"""
@@ -323,17 +415,13 @@ class Scanner:
                     dirs_to_mark.append(dir_path)
 
                     if len(batch) >= BATCH_SIZE:
-                        self._save_batch(batch)
-                        for d in dirs_to_mark:
-                            self.db.mark_dir_scanned(d, mount_name)
+                        self._save_batch(batch, dirs_to_mark, mount_name)
                         batch = []
                         dirs_to_mark = []
 
-                # Save any remaining results
-                if batch:
-                    self._save_batch(batch)
-                    for d in dirs_to_mark:
-                        self.db.mark_dir_scanned(d, mount_name)
+                # Save any remaining results, including trailing directories without files
+                if batch or dirs_to_mark:
+                    self._save_batch(batch, dirs_to_mark, mount_name)
 
                 if self.shutdown:
                     pool.terminate()
@@ -346,9 +434,9 @@ class Scanner:
         
         self._print_stats(mount_name)
     
-    def _save_batch(self, batch):
-        """Save batch and update stats"""
-        self.db.save_files(batch)
+    def _save_batch(self, batch, scanned_dirs, mount_name):
+        """Save batch, mark its directories scanned and update stats"""
+        self.db.save_files(batch, scanned_dirs, mount_name)
         
         # Update stats
         self.files_scanned += len(batch)
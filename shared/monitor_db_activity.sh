@@ -34,7 +34,7 @@ while true; do
     
     echo "[$timestamp] Writes/sec: $rate | Time since last write: ${time_since_write}s"
     echo "Last 5 entries:"
-    sqlite3 -header "$DB_PATH" "SELECT datetime(scan_time,'unixepoch') AS time, path FROM files ORDER BY scan_time DESC LIMIT 5" 2>/dev/null || echo "Unable to read database"
+    sqlite3 -header "$DB_PATH" "SELECT datetime(scan_time,'unixepoch') AS time, path FROM files_by_path ORDER BY scan_time DESC LIMIT 5" 2>/dev/null || echo "Unable to read database"
     echo
     prev_count=$current_count
 done
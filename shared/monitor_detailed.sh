@@ -121,15 +121,17 @@ main_monitor() {
         show_process_details
         show_container_logs
         
-        # Database progress with timestamp
+        # Database progress with timestamp. Totals are summed from a per-mount
+        # grouping, which walks idx_files_mount_size once in order; a bare
+        # COUNT(DISTINCT mount_point) would need an extra temp B-tree.
         echo "=== DATABASE PROGRESS ==="
         timeout 10 sqlite3 "$DB_PATH" "
         SELECT 
             datetime('now') as timestamp,
-            COUNT(*) as total_files,
-            printf('%.2f', SUM(size)/1024.0/1024/1024) as total_gb,
-            COUNT(DISTINCT mount_point) as mount_points
-        FROM files" 2>/dev/null || echo "❌ Cannot read database"
+            COALESCE(SUM(n), 0) as total_files,
+            printf('%.2f', SUM(bytes)/1024.0/1024/1024) as total_gb,
+            COUNT(mount_point) as mount_points
+        FROM (SELECT mount_point, COUNT(*) AS n, SUM(size) AS bytes FROM files GROUP BY mount_point)" 2>/dev/null || echo "❌ Cannot read database"
         
         echo ""
         echo "Press Ctrl+C to exit. Refreshing in 10 seconds..."
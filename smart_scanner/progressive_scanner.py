@@ -82,14 +82,15 @@ class ContainerManager:
         self.semaphore.acquire()
         
         try:
-            container_name = self._sanitize_container_name(chunk['path'])
+            chunk_path = chunk['path']
+            container_name = self._sanitize_container_name(chunk_path)
             
-            if not os.path.exists(chunk['path']):
-                logger.error(f"Path does not exist: {chunk['path']}")
+            if not os.path.exists(chunk_path):
+                logger.error(f"Path does not exist: {chunk_path}")
                 return None
                 
-            if is_empty_directory(chunk['path']):
-                logger.info(f"Skipping empty directory: {chunk['path']}")
+            if is_empty_directory(chunk_path):
+                logger.info(f"Skipping empty directory: {chunk_path}")
                 return None
             
             # Determine mount path for database
@@ -102,11 +103,11 @@ class ContainerManager:
                 
             cmd = [
                 'docker', 'run', '-d', '--name', container_name, '--rm',
-                '-v', f"{chunk['path']}:{chunk['path']}:ro",
+                '-v', f"{chunk_path}:{chunk_path}:ro",
                 '-v', f"{db_mount_source}:/data",
                 '--cpus', '8', '--memory', '8g',
                 image_name, 'python', 'nas_scanner_hp.py',
-                chunk['path'], chunk['mount_name'],
+                chunk_path, chunk['mount_name'],
                 '--db', f"/data/{os.path.basename(db_path)}",
                 '--workers', '8'
             ]
@@ -125,7 +126,7 @@ class ContainerManager:
                     'retries': 0
                 }
                 
-            logger.info(f"Started container {container_name} for {chunk['path']}")
+            logger.info(f"Started container {container_name} for {chunk_path}")
             return container_name
             
         except Exception as e:
@@ -282,7 +283,7 @@ class DatabaseManager:
             self._flush_completed_chunks()
             
     def load_scanned_chunks(self, mount_name=None):
-        """Load previously scanned chunks"""
+        """Load previously scanned chunks in one query, as a set for O(1) membership checks"""
         try:
             with sqlite3.connect(self.db_path, timeout=DB_TIMEOUT) as conn:
                 cursor = conn.cursor()
@@ -290,7 +291,7 @@ class DatabaseManager:
                     cursor.execute('SELECT path FROM scanned_dirs WHERE mount_point = ?', (mount_name,))
                 else:
                     cursor.execute('SELECT path FROM scanned_dirs')
-                return {row[0] for row in cursor.fetchall()}
+                return {row[0] for row in cursor}
         except Exception as e:
             logging.error(f"Error loading scanned chunks: {e}")
             return set()
@@ -469,7 +470,8 @@ def main():
         chunks, all_subdirs = generate_initial_chunks(args.mount_path, args.mount_name, scanned_chunks, logger)
         
         # Initialize pending paths (excluding already processed)
-        pending_paths = [d for d in all_subdirs if d not in scanned_chunks and d not in [c['path'] for c in chunks]]
+        chunk_paths = {c['path'] for c in chunks}
+        pending_paths = [d for d in all_subdirs if d not in scanned_chunks and d not in chunk_paths]
         logger.info(f"Initial chunks: {len(chunks)}, Pending paths: {len(pending_paths)}")
         
         # Track containers and failures
@@ -486,11 +488,11 @@ def main():
                 failed_chunks.append((chunk, 0))
         
         # Main processing loop
-        last_status_time = time.time()
-        last_status_check = time.time()
+        last_status_time = time.monotonic()
+        last_status_check = last_status_time
         
         while active_containers or pending_paths or failed_chunks:
-            current_time = time.time()
+            current_time = time.monotonic()
             
             # Periodic status logging
             if current_time - last_status_time > 30:
@@ -5,27 +5,98 @@ Spawns containers per directory chunk based on size analysis
 """
 
 import os
+import string
 import sys
+import re
 import json
 import time
 import logging
 import subprocess
+import sqlite3
 import argparse
 from pathlib import Path
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
 import signal
+import queue
+import itertools
+import heapq
+import io
+from collections import defaultdict
+from dataclasses import dataclass, field
+from operator import itemgetter
 from typing import Dict, List, Optional, Tuple
 
+# nas_scanner_hp.py ships next to this file in the image (see Dockerfile.smart)
+# and owns the shared schema; in a checkout it lives in ../mono_scanner
+try:
+    from nas_scanner_hp import create_schema
+except ImportError:
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mono_scanner'))
+    from nas_scanner_hp import create_schema
+
 # Configuration
-CHUNK_SIZE_GB = 100
-CHUNK_SIZE_BYTES = CHUNK_SIZE_GB * 1024 * 1024 * 1024
-MAX_CONTAINERS = 8
 CONTAINER_RESOURCES = {
     'cpus': '12',
     'memory': '12g'
 }
+# Directories between analysis progress lines
+PROGRESS_LOG_INTERVAL = 100
+# Concurrent directory walks per spinning disk; more than this just adds seeks
+ROTATIONAL_SCAN_THREADS = 2
+# Returned by the size walk once a tree is known to exceed the chunk size
+OVERSIZE = object()
+
+
+class _NameTable(dict):
+    """str.translate table that deletes every character it has no entry for"""
+    def __missing__(self, key):
+        return None
+
+
+# Container names: '/' and ' ' become '_', anything else outside [A-Za-z0-9_-] is dropped
+_NAME_TABLE = _NameTable({ord(c): c for c in string.ascii_letters + string.digits + '-_'})
+_NAME_TABLE.update(str.maketrans({'/': '_', ' ': '_'}))
+
+
+@dataclass(slots=True)
+class ScanConfig:
+    """Chunk size and container limit for one scan, set from the command line"""
+    chunk_size_gb: int = 100
+    max_containers: int = 8
+    chunk_size_bytes: int = field(init=False)
+
+    def __post_init__(self):
+        self.chunk_size_bytes = self.chunk_size_gb * 1024 * 1024 * 1024
+
+
+@dataclass(slots=True)
+class Chunk:
+    """A directory scanned by one container"""
+    path: str
+    size_gb: float
+    mount_name: str
+    depth: int = 0
+    note: Optional[str] = None
+
+
+def connect_database(db_path, timeout=10, read_only=False):
+    """Open the scan database with the same pragmas the container scanners use.
+    
+    WAL lets this process read while containers write, and synchronous=NORMAL
+    drops the per-commit fsync of the default rollback journal. A read-only
+    connection skips the journal_mode switch, which would need write access.
+    """
+    if read_only:
+        conn = sqlite3.connect(Path(db_path).resolve().as_uri() + '?mode=ro', uri=True, timeout=timeout)
+        conn.execute('PRAGMA query_only=ON')
+    else:
+        conn = sqlite3.connect(db_path, timeout=timeout)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA cache_size=-64000')  # 64MB cache
+    conn.execute('PRAGMA temp_store=MEMORY')
+    return conn
 
 def setup_logging(log_file_path=None):
     """Setup logging with both console and file output"""
@@ -69,353 +140,560 @@ def setup_logging(log_file_path=None):
 class DirectoryAnalyzer:
     """Analyzes directory sizes and creates optimal chunks"""
     
-    def __init__(self, logger, analysis_timeout=1800):
+    def __init__(self, logger, analysis_timeout=1800, scan_threads=None, db_path=None, config=None):
         self.logger = logger
+        self.db_path = db_path
+        self.config = config or ScanConfig()
+        # (st_dev, st_ino) -> (st_mtime_ns, size) of leaf directories from
+        # earlier runs, see _stored_size; _leaf_sizes collects this run's
+        self._stored_sizes = {}
+        self._leaf_sizes = {}
+        # Directory listing is latency-bound, so use more threads than containers
+        self.scan_threads = scan_threads or self.config.max_containers * 2
+        self._device_slots = {}
+        # Subdirectory lists of oversized directories, from the size walk's own listing
+        self._oversized_subdirs = {}
         self._size_cache = {}
+        # The caches above are only ever touched with single dict
+        # operations (get, set, pop, update from a dict), which are atomic in
+        # CPython - including free-threaded builds, where dicts lock
+        # internally - so they need no lock. _lock guards the counters and
+        # other read-modify-write state.
         self._lock = threading.Lock()
         self.analysis_timeout = analysis_timeout
         self._progress_counter = 0
+        self._dirs_analyzed = 0
         self._analysis_start_time = None
     
     def get_directory_size(self, path, show_progress=True):
         """Get directory size with caching and progress logging"""
-        with self._lock:
-            if path in self._size_cache:
-                if show_progress:
-                    self.logger.info(f"Using cached size for: {path} ({self._size_cache[path] / 1024**3:.2f} GB)")
-                return self._size_cache[path]
+        cached = self._size_cache.get(path)
+        if cached is not None:
+            if show_progress:
+                self.logger.debug("Using cached size for: %s (%.2f GB)", path, cached / 1024**3)
+            return cached
         
-        # For very large directories, try a faster estimation first
-        if show_progress:
-            self.logger.info(f"[{self._get_progress_indicator()}] Running fast file count check for: {path}")
-        try:
-            # Quick file count check - if too many files, skip detailed analysis
-            count_start = time.time()
-            count_result = subprocess.run(
-                ['sh', '-c', f'find "{path}" -type f | wc -l'], 
-                capture_output=True, 
-                text=True, 
-                timeout=120  # 2 minute timeout for file count
-            )
-            count_elapsed = time.time() - count_start
-            
-            if count_result.returncode == 0:
-                file_count = int(count_result.stdout.strip())
-                if show_progress:
-                    self.logger.info(f"File count result: {file_count:,} files in {path} (took {count_elapsed:.1f}s)")
-                # If more than 50K files, assume it's a large chunk and skip du
-                if file_count > 50000:  # Further lowered threshold for faster processing
-                    if show_progress:
-                        self.logger.info(f"Large directory detected ({file_count:,} files): {path} - treating as oversized chunk")
-                    with self._lock:
-                        self._size_cache[path] = CHUNK_SIZE_BYTES + 1
-                    return CHUNK_SIZE_BYTES + 1
-            else:
-                self.logger.warning(f"File count failed for {path}: {count_result.stderr}")
-        except Exception as e:
-            self.logger.warning(f"File count check failed for {path}: {e}")
-            # For root directories like /mnt/user/Archive, assume they're large
-            if '/mnt/user/' in path and path.count('/') <= 3:
-                self.logger.info(f"Root mount directory detected: {path} - treating as single chunk")
-                with self._lock:
-                    self._size_cache[path] = CHUNK_SIZE_BYTES + 1
-                return CHUNK_SIZE_BYTES + 1
+        stored = self._stored_size(path)
+        if stored is not None:
+            if show_progress:
+                self.logger.debug("Using stored size for unchanged directory: %s (%.2f GB)", path, stored / 1024**3)
+            self._size_cache[path] = stored
+            return stored
         
         try:
-            # Use du command for size calculation with progress updates
-            if show_progress:
-                self.logger.info(f"[{self._get_progress_indicator()}] Starting du analysis for: {path} (timeout: {self.analysis_timeout//60}min)")
+            # Per-directory detail is DEBUG; the progress indicator is only
+            # formatted when it will actually be emitted
+            detail = show_progress and self.logger.isEnabledFor(logging.DEBUG)
+            if detail:
+                self.logger.debug("[%s] Starting size analysis for: %s (timeout: %dmin)",
+                                  self._get_progress_indicator(), path, self.analysis_timeout // 60)
             
-            du_start = time.time()
-            # Try faster methods first before falling back to du
-            # Method 1: Use find with size calculation (faster for many small files)
-            try:
-                find_result = subprocess.run(
-                    ['find', path, '-type', 'f', '-printf', '%s\n'],
-                    capture_output=True,
-                    text=True,
-                    timeout=min(300, self.analysis_timeout // 4)  # Try find for max 5min or 1/4 of timeout
-                )
+            walk_start = time.monotonic()
+            # Walk the tree in-process, stopping as soon as it is known to be oversized
+            total_size, files_examined = self._sized_or_oversize(path, self.config.chunk_size_bytes, walk_start + self.analysis_timeout)
+            walk_elapsed = time.monotonic() - walk_start
+            if total_size is OVERSIZE:
+                if show_progress and self.logger.isEnabledFor(logging.INFO):
+                    self.logger.info("[%s] FAST: %s exceeds %s GB - stopped walking after %s files (%.1fs)",
+                                     self._get_progress_indicator(), path, self.config.chunk_size_gb,
+                                     f"{files_examined:,}", walk_elapsed)
+                total_size = self.config.chunk_size_bytes + 1
+            elif detail:
+                self.logger.debug("[%s] FAST: walk completed for %s = %.2f GB, %s files (took %.1fs)",
+                                  self._get_progress_indicator(), path, total_size / 1024**3,
+                                  f"{files_examined:,}", walk_elapsed)
+            self._size_cache[path] = total_size
+            return total_size
                 
-                if find_result.returncode == 0 and find_result.stdout.strip():
-                    # Sum up file sizes from find output
-                    sizes = [int(s) for s in find_result.stdout.strip().split('\n') if s.isdigit()]
-                    if sizes:
-                        total_size = sum(sizes)
-                        find_elapsed = time.time() - du_start
-                        if show_progress:
-                            self.logger.info(f"[{self._get_progress_indicator()}] FAST: find method completed for {path} = {total_size / 1024**3:.2f} GB (took {find_elapsed:.1f}s, {len(sizes):,} files)")
-                        with self._lock:
-                            self._size_cache[path] = total_size
-                        return total_size
-            except (subprocess.TimeoutExpired, subprocess.CalledProcessError, ValueError):
-                # Fall back to du method
-                if show_progress:
-                    self.logger.info(f"[{self._get_progress_indicator()}] find method failed/timed out, falling back to du for: {path}")
-            
-            # Method 2: Use du as fallback (slower but more reliable)
-            result = subprocess.run(
-                ['du', '-sb', '--max-depth=0', path], 
-                capture_output=True, 
-                text=True, 
-                timeout=self.analysis_timeout  # Use configurable timeout
-            )
-            du_elapsed = time.time() - du_start
-            
-            if result.returncode == 0:
-                size = int(result.stdout.split()[0])
-                if show_progress:
-                    self.logger.info(f"[{self._get_progress_indicator()}] Size analysis complete: {path} = {size / 1024**3:.2f} GB (took {du_elapsed:.1f}s)")
-                with self._lock:
-                    self._size_cache[path] = size
-                return size
-            else:
-                self.logger.warning(f"Failed to get size for {path}: {result.stderr}")
-                return 0
-                
-        except subprocess.TimeoutExpired:
+        except TimeoutError:
             if show_progress:
                 self.logger.warning(f"[{self._get_progress_indicator()}] TIMEOUT: Size analysis for {path} exceeded {self.analysis_timeout//60} minutes - treating as oversized chunk")
             # For very large directories that timeout, assume they're larger than chunk size
             # This will cause them to be processed as single chunks
-            with self._lock:
-                self._size_cache[path] = CHUNK_SIZE_BYTES + 1
-            return CHUNK_SIZE_BYTES + 1
+            self._size_cache[path] = self.config.chunk_size_bytes + 1
+            return self.config.chunk_size_bytes + 1
         except Exception as e:
             if show_progress:
                 self.logger.error(f"[{self._get_progress_indicator()}] Error getting size for {path}: {e}")
             return 0
     
+    def _sized_or_oversize(self, root, limit, deadline):
+        """Sum the sizes of regular files under root without following symlinks.
+        
+        Returns ``(size, files_examined)`` where size is the exact byte count,
+        or OVERSIZE as soon as the running total passes ``limit`` - the rest of
+        the tree is not walked since the caller is going to subdivide it
+        anyway. Raises TimeoutError past ``deadline`` and OSError if root
+        itself cannot be read.
+        
+        Totals of the immediate subdirectories are cached as they complete, so
+        subdividing an oversized root does not walk those children again, and
+        an oversized root's subdirectory list is kept so it is not listed twice.
+        """
+        total, files, child_dirs, st = self._scan_dir(root, deadline)
+        if total > limit:
+            self._oversized_subdirs[root] = child_dirs
+            return OVERSIZE, files
+        if not child_dirs:
+            self._leaf_sizes[(st.st_dev, st.st_ino)] = (st.st_mtime_ns, total)
+        
+        for child in child_dirs:
+            child_size = self._size_cache.get(child)
+            if child_size is None:
+                child_size, child_files = self._walk_tree(child, limit, deadline)
+                files += child_files
+                if child_size is OVERSIZE:
+                    child_size = limit + 1
+                self._size_cache[child] = child_size
+            total += child_size
+            if total > limit:
+                self._oversized_subdirs[root] = child_dirs
+                return OVERSIZE, files
+        return total, files
+    
+    def _stored_size(self, path):
+        """Size of a leaf directory recorded by an earlier run, if its mtime has not changed since.
+        
+        Only directories without subdirectories are stored. Adding, removing
+        or renaming an entry - including creating a subdirectory - moves the
+        directory's own mtime, so an unchanged mtime means the same set of
+        files. Files that grow or shrink in place are not noticed; their
+        directory is re-listed once anything else in it changes. Every
+        directory above a leaf is listed on each run, so changes anywhere
+        else in the tree are always seen.
+        """
+        if not self._stored_sizes:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        key = (st.st_dev, st.st_ino)
+        stored = self._stored_sizes.get(key)
+        if stored is not None and stored[0] == st.st_mtime_ns:
+            self._leaf_sizes[key] = stored
+            return stored[1]
+        return None
+    
+    def _load_stored_sizes(self, root_path):
+        """Read the leaf sizes kept in the dir_size_cache table by the last run over root_path"""
+        if not self.db_path:
+            return
+        try:
+            conn = connect_database(self.db_path)
+            try:
+                self._stored_sizes = {
+                    (dev, ino): (mtime_ns, size)
+                    for dev, ino, mtime_ns, size in conn.execute(
+                        "SELECT dev, ino, mtime_ns, size FROM dir_size_cache WHERE root = ?", (root_path,))
+                }
+            finally:
+                conn.close()
+            self.logger.info(f"Loaded {len(self._stored_sizes):,} stored directory sizes")
+        except Exception as e:
+            self.logger.warning(f"Could not load stored directory sizes: {e}")
+    
+    def _save_stored_sizes(self, root_path):
+        """Replace root_path's stored leaf sizes with the ones seen this run.
+        
+        Entries for directories that were deleted, or that were not reached
+        this time, are dropped with the rest, so the table never holds more
+        than one run's leaves per root.
+        """
+        if not self.db_path:
+            return
+        # Keyed on the stat taken before each listing, so a directory that
+        # changed while it was being listed fails the mtime check next run
+        rows = [(dev, ino, mtime_ns, size, root_path)
+                for (dev, ino), (mtime_ns, size) in list(self._leaf_sizes.items())]
+        try:
+            conn = connect_database(self.db_path)
+            try:
+                conn.execute("DELETE FROM dir_size_cache WHERE root = ?", (root_path,))
+                conn.executemany(
+                    "INSERT INTO dir_size_cache (dev, ino, mtime_ns, size, root) VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+                conn.commit()
+            finally:
+                conn.close()
+            self.logger.info(f"Stored {len(rows):,} directory sizes for the next run")
+        except Exception as e:
+            self.logger.warning(f"Could not store directory sizes: {e}")
+    
+    @staticmethod
+    def _scan_dir(path, deadline):
+        """List one directory: (bytes in regular files, file count, subdirectory paths, stat).
+        
+        DirEntry type checks come from the directory listing itself, so the
+        only per-entry syscall is the lstat for a regular file's size. The
+        directory is scanned through an open fd, which makes that an
+        fstatat() relative to it - the kernel does not re-resolve the full
+        path for every file.
+        
+        The deadline is checked every 1024 files as well, so a single huge
+        flat directory cannot run past the analysis timeout. The directory's
+        own stat is taken before the listing, for storing leaf sizes.
+        """
+        size = 0
+        files = 0
+        subdirs = []
+        fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            st = os.fstat(fd)
+            with os.scandir(fd) as it:
+                for entry in it:
+                    try:
+                        # Files first - they vastly outnumber directories
+                        if entry.is_file(follow_symlinks=False):
+                            size += entry.stat(follow_symlinks=False).st_size
+                            files += 1
+                            if not files & 1023 and time.monotonic() > deadline:
+                                raise TimeoutError(f"size walk of {path} timed out")
+                        elif entry.is_dir(follow_symlinks=False):
+                            subdirs.append(os.path.join(path, entry.name))
+                    except TimeoutError:
+                        raise
+                    except OSError:
+                        continue
+        finally:
+            os.close(fd)
+        return size, files, subdirs, st
+    
+    def _walk_tree(self, root, limit, deadline):
+        """Depth-first walk behind _sized_or_oversize; unreadable directories count as empty.
+        
+        Each open directory is a frame of [path, total, unvisited subdirs,
+        finished subdirs]. A directory's files are added to the running sum
+        as soon as it is listed, so an oversized tree is abandoned early; a
+        frame is folded into its parent once all of its subdirectories are
+        done. On an early exit the finished subtrees that are still
+        unfolded (the largest complete ones) are cached. Leaf directories
+        with an unchanged stored size are not listed at all.
+        """
+        finished = {}
+        running = 0
+        files = 0
+        stack = []
+        path = root
+        while True:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"size walk of {root} timed out")
+            stored = self._stored_size(path)
+            if stored is not None:
+                size, count, subdirs = stored, 0, []
+            else:
+                try:
+                    size, count, subdirs, st = self._scan_dir(path, deadline)
+                except TimeoutError:
+                    raise
+                except OSError:
+                    size, count, subdirs = 0, 0, []
+                else:
+                    if not subdirs:
+                        self._leaf_sizes[(st.st_dev, st.st_ino)] = (st.st_mtime_ns, size)
+            running += size
+            files += count
+            if running > limit:
+                self._size_cache.update(finished)
+                return OVERSIZE, files
+            stack.append([path, size, subdirs, []])
+            
+            # Fold completed directories into their parents until one has
+            # a subdirectory left to visit
+            while not stack[-1][2]:
+                done_path, done_total, _, done_children = stack.pop()
+                if not stack:
+                    return done_total, files
+                for child in done_children:
+                    del finished[child]
+                finished[done_path] = done_total
+                parent = stack[-1]
+                parent[1] += done_total
+                parent[3].append(done_path)
+            path = stack[-1][2].pop()
+    
     def _get_progress_indicator(self):
         """Get a progress indicator for logging"""
         with self._lock:
             self._progress_counter += 1
             if self._analysis_start_time:
-                elapsed = time.time() - self._analysis_start_time
+                elapsed = time.monotonic() - self._analysis_start_time
                 return f"{self._progress_counter:3d} | {elapsed//60:02.0f}:{elapsed%60:02.0f}"
             return f"{self._progress_counter:3d}"
 
+    @staticmethod
+    def _visible_subdirs(root_path):
+        """Top-level directories of root_path, leaving out hidden ones such as .Recycle.Bin"""
+        # DirEntry.is_dir() answers from the directory listing; only
+        # symlinks need an extra stat to see what they point at
+        with os.scandir(root_path) as it:
+            return [entry.path for entry in it
+                    if not entry.name.startswith('.') and entry.is_dir()]
+
     def list_quick_chunks(self, root_path, mount_name):
         """Return top-level directories as chunks without size analysis - IMPROVED"""
         chunks = []
         self.logger.info(f"🚀 FAST START: Creating chunks immediately for {root_path}")
         
         try:
-            entries = os.listdir(root_path)
-            directories = [os.path.join(root_path, entry) for entry in entries 
-                          if os.path.isdir(os.path.join(root_path, entry)) and not entry.startswith('.')]
+            directories = self._visible_subdirs(root_path)
             
             if directories:
                 self.logger.info(f"Found {len(directories)} top-level directories - creating chunks now!")
                 for i, dir_path in enumerate(directories):
-                    chunks.append({
-                        'path': dir_path,
-                        'size_gb': 0,
-                        'mount_name': mount_name,
-                        'depth': 1,
-                        'note': 'fast-start-toplevel'
-                    })
+                    chunks.append(Chunk(
+                        path=dir_path,
+                        size_gb=0,
+                        mount_name=mount_name,
+                        depth=1,
+                        note='fast-start-toplevel'
+                    ))
                     self.logger.info(f"✓ Chunk {i+1}: {dir_path}")
             else:
                 # No subdirectories, scan the whole root
-                chunks.append({
-                    'path': root_path,
-                    'size_gb': 0,
-                    'mount_name': mount_name,
-                    'depth': 0,
-                    'note': 'fast-start-root'
-                })
+                chunks.append(Chunk(
+                    path=root_path,
+                    size_gb=0,
+                    mount_name=mount_name,
+                    depth=0,
+                    note='fast-start-root'
+                ))
                 self.logger.info(f"✓ Root chunk: {root_path}")
                 
         except Exception as e:
             self.logger.error(f"Error listing directories in {root_path}: {e}")
             # Emergency fallback
-            chunks.append({
-                'path': root_path,
-                'size_gb': 0,
-                'mount_name': mount_name,
-                'depth': 0,
-                'note': 'fast-start-emergency'
-            })
+            chunks.append(Chunk(
+                path=root_path,
+                size_gb=0,
+                mount_name=mount_name,
+                depth=0,
+                note='fast-start-emergency'
+            ))
 
         self.logger.info(f"🎯 FAST START COMPLETE: {len(chunks)} chunks ready immediately!")
         self.logger.info("🚀 SCANNING WILL START NOW - no waiting for analysis!")
         return chunks
     
+    @staticmethod
+    def _has_nested_mounts(root_path):
+        """Whether any filesystem is mounted below root_path; True if that can't be told"""
+        root = os.path.realpath(root_path).rstrip('/') + '/'
+        try:
+            with open('/proc/self/mounts') as f:
+                for line in f:
+                    fields = line.split()
+                    if len(fields) < 2:
+                        continue
+                    # Spaces and other separators in mount points are octal escapes
+                    mount_point = re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), fields[1])
+                    if mount_point.startswith(root):
+                        return True
+        except OSError:
+            return True
+        return False
+    
     def find_optimal_chunks(self, root_path, mount_name):
-        """Find optimal directory chunks for scanning with parallel analysis"""
-        chunks = []
-        self._analysis_start_time = time.time()
+        """Find optimal directory chunks, yielding each one as soon as its size is known"""
+        found = 0
+        self._analysis_start_time = time.monotonic()
         self._progress_counter = 0
-        
-        def analyze_directory(dir_path, depth=0):
-            """Recursively analyze directory structure"""
+        self._dirs_analyzed = 0
+
+        # An Unraid share root is split into its visible top-level
+        # directories straight away, the same set list_quick_chunks uses, so
+        # hidden ones like .Recycle.Bin never become chunks
+        seeds = [(root_path, 0)]
+        if '/mnt/user/' in root_path:
             try:
-                # For root mount points, use parallel analysis of subdirectories
-                if depth == 0 and '/mnt/user/' in dir_path:
-                    self.logger.info(f"Root mount point detected: {dir_path} - analyzing subdirectories for optimal chunking")
-                    try:
-                        subdirs = [d for d in os.listdir(dir_path) 
-                                 if os.path.isdir(os.path.join(dir_path, d)) and not d.startswith('.')]
-                        
-                        if subdirs:
-                            self.logger.info(f"Found {len(subdirs)} subdirectories in {dir_path} - starting parallel analysis")
-                            
-                            # Analyze subdirectories in parallel for faster processing
-                            subdir_paths = [os.path.join(dir_path, subdir) for subdir in subdirs]
-                            self._analyze_directories_parallel(subdir_paths, mount_name, chunks, depth + 1)
-                            return
-                        else:
-                            self.logger.warning(f"No subdirectories found in {dir_path} - treating as single chunk")
-                            # Fall through to normal analysis if no subdirectories
-                    except (PermissionError, OSError) as e:
-                        self.logger.warning(f"Cannot list root directory {dir_path}: {e} - treating as single chunk")
-                        # Fall through to normal analysis
-                
-                # Get size of current directory (for non-root or fallback cases)
-                dir_size = self.get_directory_size(dir_path, show_progress=True)
-                
-                self.logger.info(f"{'  ' * depth}[{self._get_progress_indicator()}] Analysis result: {dir_path} = {dir_size / 1024**3:.2f} GB")
-                
-                # If directory is small enough or we can't subdivide further, add as chunk
-                if dir_size <= CHUNK_SIZE_BYTES:
-                    chunk = {
-                        'path': dir_path,
-                        'size_gb': dir_size / 1024**3,
-                        'mount_name': mount_name,
-                        'depth': depth
-                    }
-                    chunks.append(chunk)
-                    self.logger.info(f"{'  ' * depth}✓ [CHUNK {len(chunks)}] Added: {dir_path} ({dir_size / 1024**3:.2f} GB)")
+                top_level = self._visible_subdirs(root_path)
+            except OSError as e:
+                self.logger.warning(f"Cannot list root directory {root_path}: {e} - treating as single chunk")
+                top_level = []
+            if top_level:
+                self.logger.info(f"Found {len(top_level)} top-level directories in {root_path}")
+                seeds = [(path, 1) for path in top_level]
+
+        # statvfs only covers the filesystem root_path itself is on, but the
+        # size walk follows directories into anything mounted below it. If
+        # nothing is, a filesystem holding less than one chunk in total
+        # can't contain an oversized directory - skip the walk entirely. A
+        # share that was split above keeps its split.
+        try:
+            fs = os.statvfs(root_path)
+            used = (fs.f_blocks - fs.f_bfree) * fs.f_frsize
+            if (used <= self.config.chunk_size_bytes and seeds == [(root_path, 0)]
+                    and not self._has_nested_mounts(root_path)):
+                self.logger.info(f"Filesystem for {root_path} holds only {used / 1024**3:.2f} GB - using it as a single chunk")
+                yield Chunk(
+                    path=root_path,
+                    size_gb=used / 1024**3,
+                    mount_name=mount_name,
+                    depth=0,
+                    note='Small filesystem'
+                )
+                return
+        except OSError as e:
+            self.logger.warning(f"statvfs failed for {root_path}: {e}")
+
+        # Every directory that still needs sizing is a work item; workers
+        # push the subdirectories of oversized directories back onto the
+        # queue, so all levels of the tree are analyzed concurrently.
+        # ``pending`` counts queued plus in-progress items - it reaches zero
+        # only once nothing is left to subdivide.
+        work = queue.SimpleQueue()
+        results = queue.SimpleQueue()
+        stop = threading.Event()
+        pending = len(seeds)
+        pending_lock = threading.Lock()
+
+        def worker():
+            nonlocal pending
+            while True:
+                item = work.get()
+                if item is None or stop.is_set():
                     return
-                
-                # Try to subdivide large directories
-                subdirs = []
+                dir_path, depth = item
                 try:
-                    for item in os.listdir(dir_path):
-                        item_path = os.path.join(dir_path, item)
-                        if os.path.isdir(item_path) and not os.path.islink(item_path):
-                            subdirs.append(item_path)
-                except (PermissionError, OSError) as e:
-                    self.logger.warning(f"Cannot list directory {dir_path}: {e}")
-                    # Add as chunk anyway if we can't subdivide
-                    chunks.append({
-                        'path': dir_path,
-                        'size_gb': dir_size / 1024**3,
-                        'mount_name': mount_name,
-                        'depth': depth,
-                        'note': 'Cannot subdivide - permission denied'
-                    })
-                    return
-                
-                # If no subdirectories, add current directory as chunk
-                if not subdirs:
-                    chunk = {
-                        'path': dir_path,
-                        'size_gb': dir_size / 1024**3,
-                        'mount_name': mount_name,
-                        'depth': depth,
-                        'note': 'Leaf directory'
-                    }
-                    chunks.append(chunk)
-                    self.logger.info(f"{'  ' * depth}✓ [CHUNK {len(chunks)}] Added leaf: {dir_path} ({dir_size / 1024**3:.2f} GB)")
-                    return
-                
-                # Recursively analyze subdirectories
+                    with self._slots_for(dir_path):
+                        subdirs = self._analyze_directory(dir_path, depth, mount_name, results.put)
+                except Exception as e:
+                    self.logger.error(f"Error analyzing {dir_path}: {e}")
+                    # Add as chunk anyway
+                    results.put(Chunk(
+                        path=dir_path,
+                        size_gb=0,
+                        mount_name=mount_name,
+                        depth=depth,
+                        note=f'Error: {str(e)}'
+                    ))
+                    subdirs = ()
+                with pending_lock:
+                    pending += len(subdirs) - 1
+                    finished = pending == 0
                 for subdir in subdirs:
-                    analyze_directory(subdir, depth + 1)
-                    
-            except Exception as e:
-                self.logger.error(f"Error analyzing {dir_path}: {e}")
-                # Add as chunk anyway
-                chunk = {
-                    'path': dir_path,
-                    'size_gb': 0,
-                    'mount_name': mount_name,
-                    'depth': depth,
-                    'note': f'Error: {str(e)}'
-                }
-                chunks.append(chunk)
-                self.logger.error(f"[CHUNK {len(chunks)}] Added error chunk: {dir_path}")
-        
-        self.logger.info(f"Starting comprehensive analysis of {root_path}")
-        analyze_directory(root_path)
-        
-        total_analysis_time = time.time() - self._analysis_start_time
-        self.logger.info(f"Analysis complete! Found {len(chunks)} chunks in {total_analysis_time//60:.0f}m {total_analysis_time%60:.0f}s")
-        
-        # Sort chunks by size (largest first) for better load balancing
-        chunks.sort(key=lambda x: x['size_gb'], reverse=True)
+                    work.put((subdir, depth + 1))
+                if finished:
+                    results.put(None)
+
+        self._leaf_sizes = {}
+        self._load_stored_sizes(root_path)
+        self.logger.info(f"Starting comprehensive analysis of {root_path} with {self.scan_threads} threads")
+        workers = [threading.Thread(target=worker, name=f'analyzer-{i}', daemon=True)
+                   for i in range(self.scan_threads)]
+        for t in workers:
+            t.start()
+        for seed in seeds:
+            work.put(seed)
+        try:
+            while True:
+                chunk = results.get()
+                if chunk is None:
+                    break
+                found += 1
+                note = f" [{chunk.note}]" if chunk.note else ''
+                self.logger.info(f"{'  ' * chunk.depth}✓ [CHUNK {found}] Added: {chunk.path} ({chunk.size_gb:.2f} GB){note}")
+                yield chunk
+        finally:
+            stop.set()
+            for _ in workers:
+                work.put(None)
         
-        return chunks
+        self._save_stored_sizes(root_path)
+        total_analysis_time = time.monotonic() - self._analysis_start_time
+        self.logger.info(f"Analysis complete! Found {found} chunks in {total_analysis_time//60:.0f}m {total_analysis_time%60:.0f}s")
+    
+    def _slots_for(self, path):
+        """Semaphore limiting concurrent walks on the block device holding path"""
+        dev = os.stat(path).st_dev
+        with self._lock:
+            slots = self._device_slots.get(dev)
+            if slots is None:
+                slots = self._device_slots[dev] = threading.Semaphore(self._device_concurrency(dev))
+        return slots
     
-    def _analyze_directories_parallel(self, dir_paths, mount_name, chunks, depth):
-        """Analyze multiple directories in parallel for faster processing"""
-        self.logger.info(f"Starting parallel analysis of {len(dir_paths)} directories...")
+    def _device_concurrency(self, dev):
+        """Walks allowed at once on a device - few on a spinning disk, all threads otherwise.
         
-        def analyze_single(dir_path):
-            """Analyze a single directory and return chunk info"""
+        Devices without a block queue in sysfs (FUSE user shares, network
+        mounts) are not limited.
+        """
+        block = f"/sys/dev/block/{os.major(dev)}:{os.minor(dev)}"
+        # Partitions keep the queue settings on their parent disk
+        for queue_dir in (os.path.join(block, 'queue'), os.path.join(block, '..', 'queue')):
             try:
-                dir_size = self.get_directory_size(dir_path, show_progress=True)
-                
-                # If small enough, return as chunk
-                if dir_size <= CHUNK_SIZE_BYTES:
-                    return {
-                        'path': dir_path,
-                        'size_gb': dir_size / 1024**3,
-                        'mount_name': mount_name,
-                        'depth': depth,
-                        'note': 'Parallel analysis'
-                    }
-                else:
-                    # For large directories, we'll need recursive analysis later
-                    # For now, just mark them for single-chunk processing
-                    self.logger.info(f"Large directory found: {dir_path} ({dir_size / 1024**3:.2f} GB) - will process as single chunk")
-                    return {
-                        'path': dir_path,
-                        'size_gb': dir_size / 1024**3,
-                        'mount_name': mount_name,
-                        'depth': depth,
-                        'note': 'Large directory - single chunk'
-                    }
-            except Exception as e:
-                self.logger.error(f"Error analyzing {dir_path}: {e}")
-                return {
-                    'path': dir_path,
-                    'size_gb': 0,
-                    'mount_name': mount_name,
-                    'depth': depth,
-                    'note': f'Analysis error: {str(e)}'
-                }
+                with open(os.path.join(queue_dir, 'rotational')) as f:
+                    rotational = f.read().strip() == '1'
+            except OSError:
+                continue
+            if rotational:
+                self.logger.info(f"Device {os.major(dev)}:{os.minor(dev)} is rotational - "
+                                 f"limiting to {ROTATIONAL_SCAN_THREADS} concurrent directory walks")
+                return ROTATIONAL_SCAN_THREADS
+            break
+        return self.scan_threads
+    
+    def _analyze_directory(self, dir_path, depth, mount_name, emit):
+        """Size one directory: emit it as a chunk, or return its subdirectories to subdivide"""
+        dir_size = self.get_directory_size(dir_path, show_progress=True)
         
-        # Use ThreadPoolExecutor for parallel directory analysis
-        with ThreadPoolExecutor(max_workers=min(8, len(dir_paths))) as executor:
-            future_to_path = {executor.submit(analyze_single, path): path for path in dir_paths}
-            
-            for future in as_completed(future_to_path):
-                path = future_to_path[future]
-                try:
-                    chunk = future.result()
-                    if chunk:
-                        chunks.append(chunk)
-                        self.logger.info(f"✓ [CHUNK {len(chunks)}] Parallel result: {chunk['path']} ({chunk['size_gb']:.2f} GB)")
-                except Exception as e:
-                    self.logger.error(f"Failed to analyze {path}: {e}")
-                    # Add a fallback chunk
-                    chunks.append({
-                        'path': path,
-                        'size_gb': 0,
-                        'mount_name': mount_name,
-                        'depth': depth,
-                        'note': f'Parallel analysis failed: {str(e)}'
-                    })
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("%s[%s] Analysis result: %s = %.2f GB",
+                              '  ' * depth, self._get_progress_indicator(), dir_path, dir_size / 1024**3)
+        # One INFO line per batch of directories instead of several per directory
+        with self._lock:
+            self._dirs_analyzed += 1
+            analyzed = self._dirs_analyzed
+        if analyzed % PROGRESS_LOG_INTERVAL == 0:
+            elapsed = time.monotonic() - self._analysis_start_time
+            self.logger.info("[PROGRESS] %d directories analyzed (%02.0f:%02.0f elapsed)",
+                             analyzed, elapsed // 60, elapsed % 60)
+        
+        # If directory is small enough or we can't subdivide further, add as chunk
+        if dir_size <= self.config.chunk_size_bytes:
+            emit(Chunk(
+                path=dir_path,
+                size_gb=dir_size / 1024**3,
+                mount_name=mount_name,
+                depth=depth
+            ))
+            return ()
         
-        self.logger.info(f"Parallel analysis complete - processed {len(dir_paths)} directories")
+        # Try to subdivide large directories - the size walk usually listed them already
+        subdirs = self._oversized_subdirs.pop(dir_path, None)
+        try:
+            if subdirs is None:
+                with os.scandir(dir_path) as it:
+                    subdirs = [entry.path for entry in it if entry.is_dir(follow_symlinks=False)]
+        except (PermissionError, OSError) as e:
+            self.logger.warning(f"Cannot list directory {dir_path}: {e}")
+            # Add as chunk anyway if we can't subdivide
+            emit(Chunk(
+                path=dir_path,
+                size_gb=dir_size / 1024**3,
+                mount_name=mount_name,
+                depth=depth,
+                note='Cannot subdivide - permission denied'
+            ))
+            return ()
+        
+        # If no subdirectories, add current directory as chunk
+        if not subdirs:
+            emit(Chunk(
+                path=dir_path,
+                size_gb=dir_size / 1024**3,
+                mount_name=mount_name,
+                depth=depth,
+                note='Leaf directory'
+            ))
+        return subdirs
 
 class SmartScanner:
     """Smart scanner that manages container spawning per chunk"""
 
-    def __init__(self, db_path, image_name='nas-scanner-hp:latest', analysis_timeout=1800, skip_analysis=False):
+    def __init__(self, db_path, image_name='nas-scanner-hp:latest', analysis_timeout=1800, skip_analysis=False,
+                 scan_threads=None, config=None):
         # Setup persistent logging
         log_dir = os.path.dirname(db_path)
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -423,13 +701,36 @@ class SmartScanner:
         self.logger = setup_logging(log_file)
         
         self.db_path = db_path
+        self.config = config or ScanConfig()
+        self._db_dir = log_dir
+        self._db_basename = os.path.basename(db_path)
         self.image_name = image_name
-        self.analyzer = DirectoryAnalyzer(self.logger, analysis_timeout)
+        # Constant parts of the `docker run` command; start_container only
+        # adds the per-chunk name, volume, CPU set and scan path
+        self._run_options = [
+            '--rm',
+            '-v', f"{self._db_dir}:/data",
+            '--cpus', CONTAINER_RESOURCES['cpus'],
+            '--memory', CONTAINER_RESOURCES['memory'],
+            '--ulimit', 'nofile=65536:65536',
+        ]
+        self._scanner_command = [image_name, 'python', 'nas_scanner_hp.py']
+        self._scanner_options = ['--db', '/data/' + self._db_basename, '--workers', '12']
+        self.analyzer = DirectoryAnalyzer(self.logger, analysis_timeout, scan_threads, db_path, self.config)
         self.skip_analysis = skip_analysis
         self.active_containers = {}
+        self._containers_lock = threading.Lock()
+        self._launch_slots = None
+        self._monitor_stop = threading.Event()
+        self._events_proc = None
+        self._unclaimed_exits = {}
+        self._exits = None
+        self._cpusets = self._numa_cpusets()
+        # Outcomes are counted from the launcher and the results thread
+        self._counts_lock = threading.Lock()
         self.completed_chunks = 0
         self.failed_chunks = 0
-        self._shutdown_requested = False
+        self.unknown_chunks = 0
         self.scan_start_time = None
         
         # Log system information
@@ -438,105 +739,193 @@ class SmartScanner:
         self.logger.info(f"Database path: {db_path}")
         self.logger.info(f"Docker image: {image_name}")
         self.logger.info(f"Analysis timeout: {analysis_timeout}s ({analysis_timeout//60}min)")
-        self.logger.info(f"Max containers: {MAX_CONTAINERS}")
+        self.logger.info(f"Max containers: {self.config.max_containers}")
         self.logger.info(f"Container resources: {CONTAINER_RESOURCES}")
+        if self._cpusets:
+            self.logger.info(f"NUMA CPU sets for containers: {self._cpusets}")
         self.logger.info(f"Log file: {log_file}")
         self.logger.info("=" * 60)
         
+    @staticmethod
+    def _numa_cpusets():
+        """Split the usable CPUs into NUMA-local sets of roughly CONTAINER_RESOURCES['cpus'] cores.
+        
+        Returns docker --cpuset-cpus strings, or an empty list on single-node
+        machines where pinning would only take scheduling freedom away.
+        """
+        node_root = '/sys/devices/system/node'
+        try:
+            usable = os.sched_getaffinity(0)
+            nodes = sorted(n for n in os.listdir(node_root) if n.startswith('node') and n[4:].isdigit())
+        except (AttributeError, OSError):
+            return []
+        if len(nodes) < 2:
+            return []
+        
+        per_set = int(float(CONTAINER_RESOURCES['cpus']))
+        cpusets = []
+        for node in nodes:
+            try:
+                with open(os.path.join(node_root, node, 'cpulist')) as f:
+                    cpulist = f.read().strip()
+            except OSError:
+                continue
+            cpus = []
+            for part in cpulist.split(','):
+                if part:
+                    first, _, last = part.partition('-')
+                    cpus.extend(cpu for cpu in range(int(first), int(last or first) + 1) if cpu in usable)
+            if not cpus:
+                continue
+            # Keep hyperthread siblings next to each other so a set never
+            # shares physical cores with another set
+            cpus.sort(key=lambda cpu: (SmartScanner._first_sibling(cpu), cpu))
+            # Spread leftover cores over the sets instead of leaving them idle
+            groups = max(1, len(cpus) // per_set)
+            for i in range(groups):
+                cpusets.append(','.join(map(str, cpus[i * len(cpus) // groups:(i + 1) * len(cpus) // groups])))
+        return cpusets if len(cpusets) > 1 else []
+    
+    @staticmethod
+    def _first_sibling(cpu):
+        """Lowest CPU number sharing a physical core with cpu"""
+        try:
+            with open(f'/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list') as f:
+                return int(f.read().strip().replace('-', ',').split(',')[0])
+        except (OSError, ValueError):
+            return cpu
+    
     def create_scan_database(self):
         """Create a new database with the same schema"""
-        db_dir = os.path.dirname(self.db_path)
-        os.makedirs(db_dir, exist_ok=True)
+        os.makedirs(self._db_dir, exist_ok=True)
         
-        # Directly create the database schema.  The previous implementation
+        # Create the schema in-process.  The previous implementation
         # attempted to invoke ``nas_scanner_hp.py`` with a non-existent
         # ``--init-only`` flag which resulted in an argument parsing error.
-        # Creating the schema here avoids that issue and keeps the behaviour
-        # self-contained.
-        import sqlite3
-        conn = sqlite3.connect(self.db_path)
+        
+        # A conversion in a container can hold the write lock for a while
+        conn = connect_database(self.db_path, timeout=600)
+        # The whole schema set-up is one write transaction. SQLite DDL is
+        # transactional, so a conversion either completes or leaves the old
+        # table as it was, and the schema is only inspected once this
+        # connection holds the write lock.
+        conn.execute("BEGIN IMMEDIATE")
+
+        # The tables the scan containers write to are created (and older
+        # layouts converted) by the scanner that runs in them
+        create_schema(conn, self.logger)
+        # Running (file_type, mount_point) totals for the final summary
         conn.execute('''
-            CREATE TABLE IF NOT EXISTS files (
-                path TEXT PRIMARY KEY,
-                size INTEGER,
-                mtime REAL,
-                checksum TEXT,
-                mount_point TEXT,
+            CREATE TABLE IF NOT EXISTS agg_stats (
                 file_type TEXT,
-                extension TEXT,
-                scan_time REAL
+                mount_point TEXT,
+                n INTEGER,
+                bytes INTEGER,
+                PRIMARY KEY (file_type, mount_point)
             ) WITHOUT ROWID
         ''')
+        # Leaf directory sizes from the last analysis of each root, reused
+        # while the directory's mtime is unchanged. The table is only a
+        # cache, so one from before the root column is simply recreated.
+        if 'root' not in {row[1] for row in conn.execute("PRAGMA table_info(dir_size_cache)")}:
+            conn.execute("DROP TABLE IF EXISTS dir_size_cache")
         conn.execute('''
-            CREATE TABLE IF NOT EXISTS scan_stats (
-                mount_point TEXT PRIMARY KEY,
-                files_scanned INTEGER,
-                bytes_scanned INTEGER,
-                start_time REAL,
-                end_time REAL
-            )
+            CREATE TABLE IF NOT EXISTS dir_size_cache (
+                dev INTEGER,
+                ino INTEGER,
+                mtime_ns INTEGER,
+                size INTEGER,
+                root TEXT,
+                PRIMARY KEY (root, dev, ino)
+            ) WITHOUT ROWID
         ''')
+
+        # Keep running (file_type, mount_point) totals in ``agg_stats`` up to
+        # date as the containers insert rows, so the final summary never has
+        # to scan ``files``. The scanner writes with INSERT OR REPLACE, so the
+        # BEFORE trigger retracts a row that is about to be replaced to avoid
+        # double counting. NULLs are stored as 'unknown' so the key always
+        # conflicts properly.
+        has_agg_triggers = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'files_agg_ai'"
+        ).fetchone() is not None
         conn.execute('''
-            CREATE TABLE IF NOT EXISTS scanned_dirs (
-                path TEXT PRIMARY KEY,
-                mount_point TEXT,
-                scan_time REAL
-            ) WITHOUT ROWID
+            CREATE TRIGGER IF NOT EXISTS files_agg_bi BEFORE INSERT ON files
+            WHEN EXISTS (SELECT 1 FROM files WHERE dir_id = NEW.dir_id AND name = NEW.name)
+            BEGIN
+                UPDATE agg_stats
+                SET n = n - 1,
+                    bytes = bytes - (SELECT IFNULL(size, 0) FROM files
+                                     WHERE dir_id = NEW.dir_id AND name = NEW.name)
+                WHERE (file_type, mount_point) = (SELECT IFNULL(file_type, 'unknown'), IFNULL(mount_point, 'unknown')
+                                                  FROM files WHERE dir_id = NEW.dir_id AND name = NEW.name);
+            END
         ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS files_agg_ai AFTER INSERT ON files
+            BEGIN
+                INSERT INTO agg_stats (file_type, mount_point, n, bytes)
+                VALUES (IFNULL(NEW.file_type, 'unknown'), IFNULL(NEW.mount_point, 'unknown'), 1, IFNULL(NEW.size, 0))
+                ON CONFLICT(file_type, mount_point) DO UPDATE SET
+                    n = n + 1,
+                    bytes = bytes + excluded.bytes;
+            END
+        ''')
+        if not has_agg_triggers:
+            # Databases created before the triggers existed need a one-time backfill
+            conn.execute('''
+                INSERT OR REPLACE INTO agg_stats (file_type, mount_point, n, bytes)
+                SELECT IFNULL(file_type, 'unknown'), IFNULL(mount_point, 'unknown'), COUNT(*), IFNULL(SUM(size), 0)
+                FROM files
+                GROUP BY 1, 2
+            ''')
         conn.commit()
         conn.close()
         self.logger.info(f"Created database schema: {self.db_path}")
     
     def start_container(self, chunk):
         """Start a container for a specific chunk with enhanced error handling"""
-        chunk_name = chunk['path'].replace('/', '_').replace(' ', '_')
-        container_name = f"smart-scan-{chunk_name[-50:]}"  # Limit name length
-        
-        # Sanitize container name
-        container_name = ''.join(c for c in container_name if c.isalnum() or c in '-_')
+        # Sanitize container name in one pass, then limit its length
+        container_name = 'smart-scan-' + chunk.path.translate(_NAME_TABLE)[-50:]
         
         # Pre-flight checks
-        self.logger.info(f"Pre-flight checks for {chunk['path']}")
+        self.logger.info(f"Pre-flight checks for {chunk.path}")
         
         # Check if mount path exists and is accessible
-        if not os.path.exists(chunk['path']):
-            self.logger.error(f"Chunk path does not exist: {chunk['path']}")
+        if not os.path.exists(chunk.path):
+            self.logger.error(f"Chunk path does not exist: {chunk.path}")
             return None
             
         try:
-            # Quick accessibility test
-            os.listdir(chunk['path'])
-            self.logger.info(f"Chunk path accessible: {chunk['path']}")
+            # Quick accessibility test - reading the first entry is enough
+            with os.scandir(chunk.path) as it:
+                next(it, None)
+            self.logger.info(f"Chunk path accessible: {chunk.path}")
         except PermissionError:
-            self.logger.error(f"Permission denied accessing chunk path: {chunk['path']}")
+            self.logger.error(f"Permission denied accessing chunk path: {chunk.path}")
             return None
         except OSError as e:
-            self.logger.error(f"OS error accessing chunk path {chunk['path']}: {e}")
+            self.logger.error(f"OS error accessing chunk path {chunk.path}: {e}")
             return None
         
         # Check database directory
-        db_dir = os.path.dirname(self.db_path)
-        if not os.path.exists(db_dir):
-            self.logger.error(f"Database directory does not exist: {db_dir}")
+        if not os.path.exists(self._db_dir):
+            self.logger.error(f"Database directory does not exist: {self._db_dir}")
             return None
             
+        # Pin to the NUMA-local CPU set with the fewest running containers
+        cpuset = None
+        if self._cpusets:
+            with self._containers_lock:
+                in_use = [info.get('cpuset') for info in self.active_containers.values()]
+            cpuset = min(self._cpusets, key=in_use.count)
+        
         # Log the full docker command for debugging
-        cmd = [
-            'docker', 'run', '-d',
-            '--name', container_name,
-            '--rm',
-            '-v', f"{chunk['path']}:{chunk['path']}:ro",
-            '-v', f"{db_dir}:/data",
-            '--cpus', CONTAINER_RESOURCES['cpus'],
-            '--memory', CONTAINER_RESOURCES['memory'],
-            '--ulimit', 'nofile=65536:65536',
-            self.image_name,
-            'python', 'nas_scanner_hp.py',
-            chunk['path'],
-            chunk['mount_name'],
-            '--db', '/data/' + os.path.basename(self.db_path),
-            '--workers', '12'
-        ]
+        cmd = ['docker', 'run', '-d', '--name', container_name,
+               '-v', f"{chunk.path}:{chunk.path}:ro", *self._run_options]
+        if cpuset:
+            cmd += ['--cpuset-cpus', cpuset]
+        cmd += [*self._scanner_command, chunk.path, chunk.mount_name, *self._scanner_options]
         
         self.logger.info(f"Starting container with command: {' '.join(cmd)}")
         
@@ -545,7 +934,7 @@ class SmartScanner:
             container_id = result.stdout.strip()
             
             if not container_id:
-                self.logger.error(f"Docker run returned empty container ID for {chunk['path']}")
+                self.logger.error(f"Docker run returned empty container ID for {chunk.path}")
                 return None
             
             # Verify container is actually running
@@ -577,79 +966,35 @@ class SmartScanner:
                     self.logger.error(f"Could not inspect failed container: {e}")
                 return None
             
-            self.active_containers[container_id] = {
-                'name': container_name,
-                'chunk': chunk,
-                'start_time': time.time(),
-                'last_health_check': time.time()
-            }
+            now = time.monotonic()
+            with self._containers_lock:
+                self.active_containers[container_id] = {
+                    'name': container_name,
+                    'chunk': chunk,
+                    'cpuset': cpuset,
+                    'start_time': now,
+                    'last_log_time': now,
+                    'last_health_check': now
+                }
+                # A die event that beat the registration was parked by the watcher
+                early_exit = self._unclaimed_exits.pop(container_id, None)
             
-            self.logger.info(f"✓ Successfully started container {container_name} (ID: {container_id[:12]}) for {chunk['path']} ({chunk['size_gb']:.2f} GB)")
+            self.logger.info(f"✓ Successfully started container {container_name} (ID: {container_id[:12]}) for {chunk.path} ({chunk.size_gb:.2f} GB)")
+            if early_exit is not None:
+                self._reap_container(container_id, early_exit)
             return container_id
             
         except subprocess.TimeoutExpired:
-            self.logger.error(f"Timeout starting container for {chunk['path']} (>30s)")
+            self.logger.error(f"Timeout starting container for {chunk.path} (>30s)")
             return None
         except subprocess.CalledProcessError as e:
-            self.logger.error(f"Failed to start container for {chunk['path']}: {e.stderr}")
+            self.logger.error(f"Failed to start container for {chunk.path}: {e.stderr}")
             self.logger.error(f"Docker command failed with return code: {e.returncode}")
             return None
         except Exception as e:
-            self.logger.error(f"Unexpected error starting container for {chunk['path']}: {e}")
+            self.logger.error(f"Unexpected error starting container for {chunk.path}: {e}")
             return None
     
-    def monitor_containers(self):
-        """Monitor running containers and handle completion"""
-        while self.active_containers:
-            completed = []
-            
-            for container_id, info in self.active_containers.items():
-                try:
-                    # Check if container is still running
-                    result = subprocess.run(
-                        ['docker', 'ps', '-q', '--filter', f'id={container_id}'],
-                        capture_output=True, text=True
-                    )
-                    
-                    if not result.stdout.strip():
-                        # Container finished
-                        completed.append(container_id)
-                        
-                        # Check exit code
-                        exit_result = subprocess.run(
-                            ['docker', 'inspect', container_id, '--format', '{{.State.ExitCode}}'],
-                            capture_output=True, text=True
-                        )
-                        
-                        exit_code = int(exit_result.stdout.strip()) if exit_result.stdout.strip() else 1
-                        
-                        if exit_code == 0:
-                            self.completed_chunks += 1
-                            self.logger.info(f"✓ Completed: {info['name']} ({info['chunk']['path']})")
-                        else:
-                            self.failed_chunks += 1
-                            self.logger.error(f"✗ Failed: {info['name']} ({info['chunk']['path']}) - Exit code: {exit_code}")
-                            
-                            # Get container logs for debugging
-                            log_result = subprocess.run(
-                                ['docker', 'logs', '--tail', '10', container_id],
-                                capture_output=True, text=True
-                            )
-                            if log_result.stdout or log_result.stderr:
-                                self.logger.error(f"Container logs: {log_result.stdout}{log_result.stderr}")
-                
-                except Exception as e:
-                    self.logger.error(f"Error monitoring container {container_id}: {e}")
-                    completed.append(container_id)
-                    self.failed_chunks += 1
-            
-            # Remove completed containers
-            for container_id in completed:
-                del self.active_containers[container_id]
-            
-            if self.active_containers:
-                time.sleep(10)  # Check every 10 seconds
-    
     def scan_mount_point(self, mount_path, mount_name):
         """Scan a mount point using smart chunking with enhanced monitoring"""
         self.scan_start_time = time.time()
@@ -663,7 +1008,7 @@ class SmartScanner:
         self.logger.info(f"Mount name: {mount_name}")
         self.logger.info(f"Database: {self.db_path}")
         self.logger.info(f"Analysis timeout: {self.analyzer.analysis_timeout//60} minutes per directory")
-        self.logger.info(f"Max containers: {MAX_CONTAINERS}")
+        self.logger.info(f"Max containers: {self.config.max_containers}")
         self.logger.info(f"Start time: {datetime.fromtimestamp(self.scan_start_time).strftime('%Y-%m-%d %H:%M:%S')}")
         self.logger.info("=" * 60)
         
@@ -687,8 +1032,7 @@ class SmartScanner:
             
             # Test database accessibility
             try:
-                import sqlite3
-                conn = sqlite3.connect(self.db_path, timeout=10)
+                conn = connect_database(self.db_path)
                 conn.execute("SELECT COUNT(*) FROM files")
                 conn.close()
                 self.logger.info("Database accessible and schema verified")
@@ -697,66 +1041,95 @@ class SmartScanner:
             
             # Analyze directory structure
             self.logger.info("Starting directory analysis phase...")
-            analysis_start = time.time()
             
             # Start analysis and begin processing chunks as they're discovered
             if self.skip_analysis:
                 self.logger.info("Fast start enabled - skipping size analysis")
-                chunks = self.analyzer.list_quick_chunks(mount_path, mount_name)
+                chunk_source = self.analyzer.list_quick_chunks(mount_path, mount_name)
             else:
                 self.logger.info("Running full directory size analysis (this may take a while for large directories)")
-                chunks = self.analyzer.find_optimal_chunks(mount_path, mount_name)
-            
-            analysis_elapsed = time.time() - analysis_start
-            self.logger.info(f"Directory analysis completed in {analysis_elapsed/60:.1f} minutes")
-            
-            if not chunks:
-                self.logger.warning("No chunks found - creating single fallback chunk")
-                chunks = [{
-                    'path': mount_path,
-                    'size_gb': 0,
-                    'mount_name': mount_name,
-                    'depth': 0,
-                    'note': 'Fallback chunk - analysis failed'
-                }]
+                chunk_source = self.analyzer.find_optimal_chunks(mount_path, mount_name)
         
         except Exception as e:
             self.logger.error(f"Critical error during scan initialization: {e}")
             self.logger.error("Scan aborted due to initialization failure")
             raise
         
-        self.logger.info(f"\n=== CHUNK ANALYSIS COMPLETE ===")
-        self.logger.info(f"Found {len(chunks)} optimal chunks:")
-        total_size = sum(chunk['size_gb'] for chunk in chunks)
+        # Process chunks as the analysis produces them
+        start_time = time.monotonic()
         
-        for i, chunk in enumerate(chunks):
-            note = f" [{chunk['note']}]" if 'note' in chunk else ""
-            self.logger.info(f"  {i+1:2d}. {chunk['path']:<60} | {chunk['size_gb']:>8.2f} GB{note}")
+        # Analysis runs in its own thread and hands chunks over through a
+        # priority queue, so containers start while deeper directories are
+        # still being sized. Whenever a slot frees up the largest chunk seen
+        # so far goes next (longest-processing-time first), which keeps a big
+        # chunk from starting last and finishing alone.
+        pending = queue.PriorityQueue()
+        producer = threading.Thread(target=self._produce_chunks, args=(chunk_source, pending),
+                                    name='chunk-analysis', daemon=True)
+        producer.start()
         
-        self.logger.info(f"\nTotal size: {total_size:.2f} GB across {len(chunks)} chunks")
-        self.logger.info(f"Estimated scan time: {self._estimate_scan_time(chunks):.0f} minutes")
-        self.logger.info("===================================\n")
+        # Container launches are gated by a semaphore. One thread reads docker's
+        # die events and hands the slot back on exit, a second records each
+        # outcome (fetching logs for failures) so the event reader never waits
+        # on docker, and a third runs the periodic health checks, so the
+        # scanner needs no thread per running container. The event stream is
+        # opened before the first container starts.
+        self._launch_slots = threading.Semaphore(self.config.max_containers)
+        self._monitor_stop.clear()
+        self._exits = queue.SimpleQueue()
+        self._events_proc = self._open_exit_events()
+        watcher = threading.Thread(target=self._watch_exits, name='container-exits', daemon=True)
+        watcher.start()
+        finisher = threading.Thread(target=self._finish_exits, name='container-results', daemon=True)
+        finisher.start()
+        monitor = threading.Thread(target=self._monitor_containers, name='container-monitor', daemon=True)
+        monitor.start()
         
-        # Process chunks in batches
-        start_time = time.time()
+        chunks = []
+        total_size = 0  # GB, summed as chunks arrive
+        while True:
+            self._launch_slots.acquire()
+            _, _, chunk = pending.get()
+            if chunk is None:
+                self._launch_slots.release()
+                break
+            chunks.append(chunk)
+            total_size += chunk.size_gb
+            note = f" [{chunk.note}]" if chunk.note else ""
+            self.logger.info(f"  {len(chunks):2d}. {chunk.path:<60} | {chunk.size_gb:>8.2f} GB{note}")
+            if not self._launch_chunk(chunk):
+                self._launch_slots.release()
         
-        with ThreadPoolExecutor(max_workers=MAX_CONTAINERS) as executor:
-            # Submit all chunks
-            futures = []
-            for chunk in chunks:
-                future = executor.submit(self._process_chunk, chunk)
-                futures.append(future)
-            
-            # Wait for completion
-            for future in as_completed(futures):
-                try:
-                    future.result()
-                except Exception as e:
-                    self.logger.error(f"Chunk processing error: {e}")
-                    self.failed_chunks += 1
+        if not chunks:
+            self.logger.warning("No chunks found - creating single fallback chunk")
+            chunks = [Chunk(
+                path=mount_path,
+                size_gb=0,
+                mount_name=mount_name,
+                depth=0,
+                note='Fallback chunk - analysis failed'
+            )]
+            self._launch_slots.acquire()
+            if not self._launch_chunk(chunks[0]):
+                self._launch_slots.release()
+        
+        self.logger.info(f"\n=== CHUNK ANALYSIS COMPLETE ===")
+        self.logger.info(f"Total size: {total_size:.2f} GB across {len(chunks)} chunks")
+        self.logger.info(f"Estimated scan time: {self._estimate_scan_time(total_size, len(chunks)):.0f} minutes")
+        self.logger.info("===================================\n")
+        
+        # Every slot is back once all launched containers have exited
+        for _ in range(self.config.max_containers):
+            self._launch_slots.acquire()
+        self._monitor_stop.set()
+        self._events_proc.terminate()
+        watcher.join()
+        monitor.join()
+        self._exits.put(None)
+        finisher.join()
         
         # Final statistics
-        elapsed = time.time() - start_time
+        elapsed = time.monotonic() - start_time
         total_elapsed = time.time() - self.scan_start_time if self.scan_start_time else elapsed
         
         self.logger.info("=" * 60)
@@ -765,6 +1138,8 @@ class SmartScanner:
         self.logger.info(f"Mount: {mount_name} ({mount_path})")
         self.logger.info(f"Completed chunks: {self.completed_chunks}/{len(chunks)}")
         self.logger.info(f"Failed chunks: {self.failed_chunks}/{len(chunks)}")
+        if self.unknown_chunks > 0:
+            self.logger.info(f"Chunks with unknown outcome: {self.unknown_chunks}/{len(chunks)}")
         success_rate = (self.completed_chunks/(self.completed_chunks+self.failed_chunks)*100) if (self.completed_chunks + self.failed_chunks) > 0 else 0
         self.logger.info(f"Success rate: {success_rate:.1f}%")
         self.logger.info(f"Chunk processing time: {elapsed/60:.1f} minutes")
@@ -775,172 +1150,313 @@ class SmartScanner:
         if self.failed_chunks > 0:
             self.logger.warning(f"WARNING: {self.failed_chunks} chunks failed - check logs above for details")
             self.logger.warning("Failed chunks can be re-run individually or investigate mount accessibility")
+        if self.unknown_chunks > 0:
+            self.logger.warning(f"WARNING: {self.unknown_chunks} containers exited while the docker event stream was down - check their paths in the database")
         
         self.logger.info("=" * 60)
         
         # Show database statistics
+        self._refresh_scan_stats()
         self._show_final_stats()
     
-    def _process_chunk(self, chunk):
-        """Process a single chunk with detailed progress logging and health monitoring"""
-        chunk_start = time.time()
-        self.logger.info(f"[STARTING] Chunk processing: {chunk['path']} ({chunk['size_gb']:.2f} GB)")
+    def _produce_chunks(self, chunk_source, pending):
+        """Feed chunks from the analysis into the launch queue, then a None sentinel"""
+        analysis_start = time.monotonic()
+        # The counter breaks ties between equal sizes, so Chunk objects - which
+        # cannot be ordered - are never compared in the PriorityQueue
+        order = itertools.count()
+        try:
+            for chunk in chunk_source:
+                pending.put((-chunk.size_gb, next(order), chunk))
+        except Exception as e:
+            self.logger.error(f"Directory analysis failed: {e}")
+        finally:
+            analysis_elapsed = time.monotonic() - analysis_start
+            self.logger.info(f"Directory analysis completed in {analysis_elapsed/60:.1f} minutes")
+            pending.put((float('inf'), next(order), None))
+    
+    def _launch_chunk(self, chunk):
+        """Start the container for a chunk; returns the container ID or None on failure"""
+        self.logger.info(f"[STARTING] Chunk processing: {chunk.path} ({chunk.size_gb:.2f} GB)")
         
         container_id = self.start_container(chunk)
         if not container_id:
-            raise Exception(f"Failed to start container for {chunk['path']}")
+            with self._counts_lock:
+                self.failed_chunks += 1
+                failed = self.failed_chunks
+            self.logger.error(f"✗ [FAILED {failed}] Failed to start container for {chunk.path}")
+        return container_id
+    
+    def _open_exit_events(self):
+        """Subscribe to container exits - one ``docker events`` process for the whole scan.
+        
+        The stream is read as bytes: each line is JSON, which json.loads
+        takes directly, so there is no text decoding layer on the pipe.
+        """
+        return subprocess.Popen(
+            ['docker', 'events', '--filter', 'type=container', '--filter', 'event=die',
+             '--format', '{{json .}}'],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+    
+    def _watch_exits(self):
+        """Finish each chunk the moment docker reports its container's ``die`` event"""
+        while True:
+            for line in self._events_proc.stdout:
+                try:
+                    event = json.loads(line)
+                    attributes = event['Actor']['Attributes']
+                    if not attributes.get('name', '').startswith('smart-scan-'):
+                        continue
+                    container_id = event['Actor'].get('ID') or event['id']
+                    self._container_exited(container_id, int(attributes.get('exitCode', 1)))
+                except (ValueError, KeyError) as e:
+                    self.logger.warning(f"Ignoring unreadable docker event: {e}")
+            self._events_proc.wait()
+            self._resubscribe()
+            if self._monitor_stop.is_set():
+                return
+    
+    def _resubscribe(self):
+        """Reopen the event stream after it ends, retrying until docker answers again"""
+        if self._monitor_stop.is_set():
+            return
+        self.logger.warning("docker events stream ended - resubscribing")
+        delay = 1
+        while not self._monitor_stop.wait(delay):
+            delay = min(delay * 2, 30)
+            try:
+                self._events_proc = self._open_exit_events()
+            except Exception as e:
+                self.logger.error(f"Could not resubscribe to docker events: {e}")
+                continue
+            if self._monitor_stop.is_set():
+                # The scan ended while reopening; nothing else will stop this stream
+                self._events_proc.terminate()
+                return
+            try:
+                # Exits during the gap produced no event
+                self._reconcile_exits()
+            except Exception as e:
+                self.logger.error(f"Could not reconcile container exits: {e}")
+                self._events_proc.terminate()
+                self._events_proc.wait()
+                continue
+            return
+    
+    def _container_exited(self, container_id, exit_code):
+        """Route a die event to its chunk"""
+        with self._containers_lock:
+            if container_id not in self.active_containers:
+                # Exited before start_container registered it; claimed on registration
+                self._unclaimed_exits[container_id] = exit_code
+                return
+        self._reap_container(container_id, exit_code)
+    
+    def _reconcile_exits(self):
+        """Finish containers whose die event may have been missed while resubscribing"""
+        result = subprocess.run(
+            ['docker', 'ps', '-q', '--no-trunc', '--filter', 'name=smart-scan-'],
+            capture_output=True, text=True, timeout=30
+        )
+        if result.returncode != 0:
+            self.logger.warning(f"docker ps failed: {result.stderr.strip()}")
+            return
+        running = set(result.stdout.split())
         
-        # Wait for this specific container to complete with periodic progress updates
-        last_log_time = time.time()
-        last_health_check = time.time()
+        with self._containers_lock:
+            gone = [container_id for container_id in self.active_containers if container_id not in running]
+        for container_id in gone:
+            exit_result = subprocess.run(
+                ['docker', 'inspect', container_id, '--format', '{{.State.ExitCode}}'],
+                capture_output=True, timeout=10
+            )
+            exit_code = exit_result.stdout.strip()  # bytes; int() parses ASCII digits as-is
+            # A --rm container is usually removed before it can be inspected
+            self._reap_container(container_id, int(exit_code) if exit_code.isdigit() else None)
+    
+    def _monitor_containers(self):
+        """Progress and health checks for every running container from one thread"""
+        while not self._monitor_stop.wait(10):  # Check every 10 seconds
+            try:
+                with self._containers_lock:
+                    snapshot = list(self.active_containers.items())
+                
+                current_time = time.monotonic()
+                for container_id, info in snapshot:
+                    self._check_running_container(container_id, info, current_time)
+            except Exception as e:
+                self.logger.error(f"Error monitoring containers: {e}")
+    
+    def _reap_container(self, container_id, exit_code):
+        """Free a container's launch slot and queue its outcome - at most once per container"""
+        with self._containers_lock:
+            info = self.active_containers.pop(container_id, None)
+        if info is None:
+            return
+        self._exits.put((container_id, info, exit_code, time.monotonic()))
+        self._launch_slots.release()
+    
+    def _finish_exits(self):
+        """Record queued container outcomes until the None sentinel"""
+        while True:
+            item = self._exits.get()
+            if item is None:
+                return
+            container_id, info, exit_code, exit_time = item
+            try:
+                self._finish_chunk(container_id, info, exit_code, exit_time)
+            except Exception as e:
+                with self._counts_lock:
+                    self.failed_chunks += 1
+                self.logger.error(f"Error finishing container {container_id}: {e}")
+    
+    def _finish_chunk(self, container_id, info, exit_code, exit_time):
+        """Record the outcome of a container that has exited; exit_code None means unknown"""
+        chunk = info['chunk']
+        chunk_elapsed = exit_time - info['start_time']
+        
+        if exit_code is None:
+            with self._counts_lock:
+                self.unknown_chunks += 1
+                unknown = self.unknown_chunks
+            self.logger.warning(f"? [UNKNOWN {unknown}] {chunk.path} - container {container_id[:12]} exited while the docker event stream was down and was already removed after {chunk_elapsed/60:.1f}min")
+            try:
+                self._check_database_activity(chunk)
+            except Exception as e:
+                self.logger.warning(f"Could not check database activity for unknown outcome: {e}")
+            return
+        
+        if exit_code == 0:
+            with self._counts_lock:
+                self.completed_chunks += 1
+                completed, finished = self.completed_chunks, self.completed_chunks + self.failed_chunks
+            self.logger.info(f"✓ [COMPLETED {completed}/{finished}] {chunk.path} ({chunk.size_gb:.2f} GB) in {chunk_elapsed/60:.1f}min")
+            
+            # Log database activity check on success
+            try:
+                self._check_database_activity(chunk)
+            except Exception as e:
+                self.logger.warning(f"Could not check database activity after completion: {e}")
+            return
+        
+        with self._counts_lock:
+            self.failed_chunks += 1
+            failed = self.failed_chunks
+        self.logger.error(f"✗ [FAILED {failed}] {chunk.path} - Exit code: {exit_code} after {chunk_elapsed/60:.1f}min")
+        
+        # Get comprehensive container logs for debugging
+        try:
+            log_result = subprocess.run(
+                ['docker', 'logs', '--tail', '50', container_id],
+                capture_output=True, text=True, timeout=15
+            )
+            if log_result.stdout or log_result.stderr:
+                self.logger.error(f"Container logs (last 50 lines):\n{log_result.stdout}\n{log_result.stderr}")
+        except Exception as e:
+            self.logger.error(f"Could not retrieve container logs: {e}")
+        
+        # Try to get container resource usage at time of failure
+        try:
+            stats_result = subprocess.run(
+                ['docker', 'stats', '--no-stream', '--format', 'table {{.Container}}\t{{.CPUPerc}}\t{{.MemUsage}}', container_id],
+                capture_output=True, text=True, timeout=10
+            )
+            if stats_result.stdout:
+                self.logger.error(f"Container stats at failure:\n{stats_result.stdout}")
+        except:
+            pass
+    
+    def _check_running_container(self, container_id, info, current_time):
+        """Progress logging, health checks and stall detection for a running container"""
+        chunk = info['chunk']
+        chunk_path = chunk.path
         health_check_interval = 300  # 5 minutes
         stall_timeout = 3600  # 1 hour without any database activity (for very large chunks)
+        elapsed = current_time - info['start_time']
         
-        while True:
+        # Periodic progress logging for long-running containers
+        if current_time - info['last_log_time'] > 300:  # Every 5 minutes
+            self.logger.info("[PROGRESS] %s still running... (%.1fmin elapsed)", chunk_path, elapsed / 60)
+            info['last_log_time'] = current_time
+            
+            # Also log container resource usage
             try:
-                result = subprocess.run(
-                    ['docker', 'ps', '-q', '--filter', f'id={container_id}'],
-                    capture_output=True, text=True
+                stats_result = subprocess.run(
+                    ['docker', 'stats', '--no-stream', '--format', 'table {{.Container}}\t{{.CPUPerc}}\t{{.MemUsage}}', container_id],
+                    capture_output=True, text=True, timeout=10
                 )
-                
-                if not result.stdout.strip():
-                    # Container finished
-                    chunk_elapsed = time.time() - chunk_start
-                    
-                    exit_result = subprocess.run(
-                        ['docker', 'inspect', container_id, '--format', '{{.State.ExitCode}}'],
-                        capture_output=True, text=True
-                    )
-                    
-                    exit_code = int(exit_result.stdout.strip()) if exit_result.stdout.strip() else 1
-                    
-                    if exit_code == 0:
-                        self.completed_chunks += 1
-                        self.logger.info(f"✓ [COMPLETED {self.completed_chunks}/{self.completed_chunks+self.failed_chunks}] {chunk['path']} ({chunk['size_gb']:.2f} GB) in {chunk_elapsed/60:.1f}min")
-                        
-                        # Log database activity check on success
-                        try:
-                            self._check_database_activity(chunk)
-                        except Exception as e:
-                            self.logger.warning(f"Could not check database activity after completion: {e}")
-                            
-                    else:
-                        self.failed_chunks += 1
-                        self.logger.error(f"✗ [FAILED {self.failed_chunks}] {chunk['path']} - Exit code: {exit_code} after {chunk_elapsed/60:.1f}min")
-                        
-                        # Get comprehensive container logs for debugging
-                        try:
-                            log_result = subprocess.run(
-                                ['docker', 'logs', '--tail', '50', container_id],
-                                capture_output=True, text=True, timeout=15
-                            )
-                            if log_result.stdout or log_result.stderr:
-                                self.logger.error(f"Container logs (last 50 lines):\n{log_result.stdout}\n{log_result.stderr}")
-                        except Exception as e:
-                            self.logger.error(f"Could not retrieve container logs: {e}")
-                        
-                        # Try to get container resource usage at time of failure
-                        try:
-                            stats_result = subprocess.run(
-                                ['docker', 'stats', '--no-stream', '--format', 'table {{.Container}}\t{{.CPUPerc}}\t{{.MemUsage}}', container_id],
-                                capture_output=True, text=True, timeout=10
-                            )
-                            if stats_result.stdout:
-                                self.logger.error(f"Container stats at failure:\n{stats_result.stdout}")
-                        except:
-                            pass
-                        
-                        raise Exception(f"Container failed with exit code {exit_code}")
-                    
-                    break
-                
-                current_time = time.time()
-                
-                # Periodic progress logging for long-running containers
-                if current_time - last_log_time > 300:  # Every 5 minutes
-                    elapsed = current_time - chunk_start
-                    self.logger.info(f"[PROGRESS] {chunk['path']} still running... ({elapsed/60:.1f}min elapsed)")
-                    last_log_time = current_time
-                    
-                    # Also log container resource usage
-                    try:
-                        stats_result = subprocess.run(
-                            ['docker', 'stats', '--no-stream', '--format', 'table {{.Container}}\t{{.CPUPerc}}\t{{.MemUsage}}', container_id],
-                            capture_output=True, text=True, timeout=10
-                        )
-                        if stats_result.stdout:
-                            self.logger.info(f"Container resource usage:\n{stats_result.stdout}")
-                    except:
-                        pass
-                
-                # Periodic health checks
-                if current_time - last_health_check > health_check_interval:
-                    self.logger.info(f"[HEALTH CHECK] {chunk['path']} - Running health diagnostics...")
-                    
-                    # Check if container is responsive
-                    try:
-                        health_result = subprocess.run(
-                            ['docker', 'exec', container_id, 'ps', 'aux'],
-                            capture_output=True, text=True, timeout=30
-                        )
-                        if health_result.returncode == 0:
-                            process_count = len(health_result.stdout.strip().split('\n')) - 1
-                            self.logger.info(f"[HEALTH CHECK] Container responsive with {process_count} processes")
-                        else:
-                            self.logger.warning(f"[HEALTH CHECK] Container health check failed: {health_result.stderr}")
-                    except subprocess.TimeoutExpired:
-                        self.logger.warning(f"[HEALTH CHECK] Container health check timed out - may be under heavy load")
-                    except Exception as e:
-                        self.logger.warning(f"[HEALTH CHECK] Container health check error: {e}")
-                    
-                    # Check database activity
-                    try:
-                        self._check_database_activity(chunk)
-                    except Exception as e:
-                        self.logger.warning(f"Database activity check failed: {e}")
-                    
-                    last_health_check = current_time
-                
-                # Check for stalled processes (no database writes for too long)
-                elapsed = current_time - chunk_start
-                if elapsed > stall_timeout:
-                    self.logger.warning(f"[STALL DETECTION] {chunk['path']} has been running for {elapsed/60:.1f} minutes without completion")
-                    self.logger.warning("Consider if this chunk needs manual intervention or the timeout should be increased")
-                
-                time.sleep(10)  # Check every 10 seconds
-                
+                if stats_result.stdout:
+                    self.logger.info("Container resource usage:\n%s", stats_result.stdout)
+            except:
+                pass
+        
+        # Periodic health checks
+        if current_time - info['last_health_check'] > health_check_interval:
+            self.logger.info("[HEALTH CHECK] %s - Running health diagnostics...", chunk_path)
+            
+            # Check if container is responsive
+            try:
+                health_result = subprocess.run(
+                    ['docker', 'exec', container_id, 'ps', 'aux'],
+                    capture_output=True, text=True, timeout=30
+                )
+                if health_result.returncode == 0:
+                    process_count = health_result.stdout.strip().count('\n')
+                    self.logger.info("[HEALTH CHECK] Container responsive with %d processes", process_count)
+                else:
+                    self.logger.warning("[HEALTH CHECK] Container health check failed: %s", health_result.stderr)
+            except subprocess.TimeoutExpired:
+                self.logger.warning("[HEALTH CHECK] Container health check timed out - may be under heavy load")
             except Exception as e:
-                chunk_elapsed = time.time() - chunk_start
-                self.logger.error(f"Error waiting for container {container_id} after {chunk_elapsed/60:.1f}min: {e}")
-                
-                # Check for shutdown request
-                if self._shutdown_requested:
-                    self.logger.info("Shutdown requested, stopping chunk processing...")
-                    raise KeyboardInterrupt("Shutdown requested")
-                
-                raise
+                self.logger.warning("[HEALTH CHECK] Container health check error: %s", e)
+            
+            # Check database activity
+            try:
+                self._check_database_activity(chunk)
+            except Exception as e:
+                self.logger.warning("Database activity check failed: %s", e)
+            
+            info['last_health_check'] = current_time
+        
+        # Check for stalled processes (no database writes for too long)
+        if elapsed > stall_timeout:
+            self.logger.warning("[STALL DETECTION] %s has been running for %.1f minutes without completion",
+                                chunk_path, elapsed / 60)
+            self.logger.warning("Consider if this chunk needs manual intervention or the timeout should be increased")
     
     def _setup_signal_handlers(self):
         """Setup signal handlers for graceful shutdown"""
         def signal_handler(signum, frame):
             signal_name = signal.Signals(signum).name
-            self.logger.info(f"\n{signal_name} received - initiating graceful shutdown...")
-            self._shutdown_requested = True
+            self.logger.info("\n%s received - initiating graceful shutdown...", signal_name)
             
-            # Stop any running containers
+            # Stop any running containers with a single `docker stop`: the CLI
+            # stops its arguments concurrently, so shutdown takes as long as
+            # the slowest stop and forks one process instead of one per container
             if self.active_containers:
-                self.logger.info(f"Stopping {len(self.active_containers)} active containers...")
-                for container_id, info in list(self.active_containers.items()):
-                    try:
-                        subprocess.run(['docker', 'stop', container_id], timeout=30)
-                        self.logger.info(f"Stopped container: {info['name']}")
-                    except Exception as e:
-                        self.logger.error(f"Error stopping container {container_id}: {e}")
+                containers = list(self.active_containers.items())
+                self.logger.info("Stopping %d active containers...", len(containers))
+                try:
+                    result = subprocess.run(['docker', 'stop', *(container_id for container_id, _ in containers)],
+                                            capture_output=True, text=True, timeout=30)
+                    stopped = set(result.stdout.split())  # docker echoes each container it stopped
+                    for container_id, info in containers:
+                        if container_id in stopped:
+                            self.logger.info("Stopped container: %s", info['name'])
+                        else:
+                            self.logger.error("Error stopping container %s", container_id)
+                    if result.stderr.strip():
+                        self.logger.error("docker stop: %s", result.stderr.strip())
+                except Exception as e:
+                    self.logger.error("Error stopping containers: %s", e)
             
             # Show final stats before exiting
-            self.logger.info(f"\nShutdown Summary:")
-            self.logger.info(f"Completed chunks: {self.completed_chunks}")
-            self.logger.info(f"Failed chunks: {self.failed_chunks}")
+            self.logger.info("\nShutdown Summary:")
+            self.logger.info("Completed chunks: %d", self.completed_chunks)
+            self.logger.info("Failed chunks: %d", self.failed_chunks)
+            if self.unknown_chunks > 0:
+                self.logger.info("Chunks with unknown outcome: %d", self.unknown_chunks)
             self._show_final_stats()
             
             sys.exit(130)  # Standard exit code for Ctrl+C
@@ -951,12 +1467,11 @@ class SmartScanner:
     def _check_database_activity(self, chunk):
         """Check database activity for the current chunk"""
         try:
-            import sqlite3
-            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn = connect_database(self.db_path)
             
             # Count files for this mount point
             cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM files WHERE mount_point = ?", (chunk['mount_name'],))
+            cursor.execute("SELECT COUNT(*) FROM files WHERE mount_point = ?", (chunk.mount_name,))
             file_count = cursor.fetchone()[0]
             
             # Get total database size
@@ -970,7 +1485,7 @@ class SmartScanner:
             
             conn.close()
             
-            self.logger.info(f"[DATABASE ACTIVITY] Mount '{chunk['mount_name']}': {file_count:,} files, "
+            self.logger.info(f"[DATABASE ACTIVITY] Mount '{chunk.mount_name}': {file_count:,} files, "
                            f"Total DB: {total_count:,} files, Recent activity: {recent_count:,} files in last 5min")
             
             return {
@@ -982,67 +1497,82 @@ class SmartScanner:
             self.logger.warning(f"Database activity check failed: {e}")
             return None
     
-    def _estimate_scan_time(self, chunks):
-        """Estimate total scan time based on chunk sizes"""
+    def _estimate_scan_time(self, total_gb, chunk_count):
+        """Estimate total scan time from the chunks' combined size and count"""
         # Rough estimate: 1 minute per GB for scanning + overhead
-        total_gb = sum(chunk['size_gb'] for chunk in chunks)
         base_time = total_gb * 0.5  # 30 seconds per GB
-        overhead = len(chunks) * 2  # 2 minutes overhead per chunk
+        overhead = chunk_count * 2  # 2 minutes overhead per chunk
         return base_time + overhead
     
+    def _refresh_scan_stats(self):
+        """Copy the per-mount totals from ``agg_stats`` into ``scan_stats`` - one row per group"""
+        try:
+            conn = connect_database(self.db_path)
+            conn.execute('''
+                INSERT INTO scan_stats (mount_point, files_scanned, bytes_scanned, start_time, end_time)
+                SELECT mount_point, SUM(n), SUM(bytes), ?, ?
+                FROM agg_stats
+                GROUP BY mount_point
+                ON CONFLICT(mount_point) DO UPDATE SET
+                    files_scanned = excluded.files_scanned,
+                    bytes_scanned = excluded.bytes_scanned,
+                    end_time = excluded.end_time
+            ''', (self.scan_start_time, time.time()))
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            self.logger.error(f"Error updating scan_stats: {e}")
+    
     def _show_final_stats(self):
         """Show final database statistics"""
         try:
-            import sqlite3
-            conn = sqlite3.connect(self.db_path)
+            # Read-only: the summary never writes, so skip the write-lock machinery
+            conn = connect_database(self.db_path, read_only=True)
             cursor = conn.cursor()
             
-            # Get overall stats
-            cursor.execute("SELECT COUNT(*), SUM(size), COUNT(DISTINCT mount_point) FROM files")
-            result = cursor.fetchone()
-            total_files = result[0] or 0
-            total_bytes = result[1] or 0
-            total_mounts = result[2] or 0
-            
-            # Get per-file-type stats
-            cursor.execute("""
-                SELECT file_type, COUNT(*), SUM(size) 
-                FROM files 
-                GROUP BY file_type 
-                ORDER BY SUM(size) DESC
-            """)
-            type_stats = cursor.fetchall()
-            
-            # Get per-mount stats
-            cursor.execute("""
-                SELECT mount_point, COUNT(*), SUM(size) 
-                FROM files 
-                GROUP BY mount_point
-                ORDER BY SUM(size) DESC
-            """)
-            mount_stats = cursor.fetchall()
-            
+            # ``agg_stats`` is kept current by triggers on ``files``, so every
+            # rollup (per type, per mount and overall) comes from one row per group
+            cursor.execute("SELECT file_type, mount_point, n, bytes FROM agg_stats WHERE n > 0")
+            by_type = defaultdict(lambda: [0, 0])
+            by_mount = defaultdict(lambda: [0, 0])
+            for file_type, mount, files, size in cursor:
+                by_type[file_type][0] += files
+                by_type[file_type][1] += size
+                by_mount[mount][0] += files
+                by_mount[mount][1] += size
+
             conn.close()
             
-            self.logger.info(f"=== DATABASE STATISTICS ===")
-            self.logger.info(f"Total files scanned: {total_files:,}")
-            self.logger.info(f"Total size scanned: {total_bytes/1024**3:.2f} GB ({total_bytes/1024**4:.2f} TB)")
-            self.logger.info(f"Mount points: {total_mounts}")
+            total_files = sum(files for files, _ in by_mount.values())
+            total_bytes = sum(size for _, size in by_mount.values())
+            total_mounts = len(by_mount)
+            # Only the top 10 types are shown, so select them without sorting every type
+            type_stats = heapq.nlargest(10, ((t, f, b) for t, (f, b) in by_type.items()), key=itemgetter(2))
+            mount_stats = sorted(((m, f, b) for m, (f, b) in by_mount.items()), key=itemgetter(2), reverse=True)
+            
+            # The report goes out as one log record: one handler lock and
+            # one write per handler instead of one per line
+            report = io.StringIO()
+            print("=== DATABASE STATISTICS ===", file=report)
+            print(f"Total files scanned: {total_files:,}", file=report)
+            print(f"Total size scanned: {total_bytes/1024**3:.2f} GB ({total_bytes/1024**4:.2f} TB)", file=report)
+            print(f"Mount points: {total_mounts}", file=report)
             
             if type_stats:
-                self.logger.info(f"\nBy file type:")
-                for file_type, files, size in type_stats[:10]:  # Top 10
-                    self.logger.info(f"  {file_type or 'unknown':<12}: {files:>8,} files, {size/1024**3:>8.2f} GB")
+                print("\nBy file type:", file=report)
+                for file_type, files, size in type_stats:
+                    print(f"  {file_type:<12}: {files:>8,} files, {size/1024**3:>8.2f} GB", file=report)
             
             if mount_stats:
-                self.logger.info(f"\nBy mount point:")
+                print("\nBy mount point:", file=report)
                 for mount, files, size in mount_stats:
-                    self.logger.info(f"  {mount:<20}: {files:>8,} files, {size/1024**3:>8.2f} GB")
+                    print(f"  {mount:<20}: {files:>8,} files, {size/1024**3:>8.2f} GB", file=report)
             
-            self.logger.info("=============================")
+            print("=============================", end='', file=report)
+            self.logger.info("%s", report.getvalue())
                 
         except Exception as e:
-            self.logger.error(f"Error getting final stats: {e}")
+            self.logger.error("Error getting final stats: %s", e)
 
 def main():
     parser = argparse.ArgumentParser(description='Smart NAS Scanner with Intelligent Chunking')
@@ -1053,18 +1583,16 @@ def main():
     parser.add_argument('--max-containers', type=int, default=8, help='Maximum concurrent containers')
     parser.add_argument('--image', default='nas-scanner-hp:latest', help='Docker image to use')
     parser.add_argument('--analysis-timeout', type=int, default=1800, help='Directory analysis timeout in seconds (default: 1800 = 30 minutes)')
+    parser.add_argument('--scan-threads', type=int, help='Directory analysis threads (default: 2 x max containers)')
     parser.add_argument('--fast-start', action='store_true', help='Skip size analysis and scan each top-level directory directly')
     
     args = parser.parse_args()
     
-    # Update global configuration
-    global CHUNK_SIZE_GB, CHUNK_SIZE_BYTES, MAX_CONTAINERS
-    CHUNK_SIZE_GB = args.chunk_size
-    CHUNK_SIZE_BYTES = CHUNK_SIZE_GB * 1024 * 1024 * 1024
-    MAX_CONTAINERS = args.max_containers
+    config = ScanConfig(chunk_size_gb=args.chunk_size, max_containers=args.max_containers)
     
     # Create and run scanner
-    scanner = SmartScanner(args.db, args.image, args.analysis_timeout, skip_analysis=args.fast_start)
+    scanner = SmartScanner(args.db, args.image, args.analysis_timeout, skip_analysis=args.fast_start,
+                           scan_threads=args.scan_threads, config=config)
     scanner.scan_mount_point(args.mount_path, args.mount_name)
 
 if __name__ == '__main__':
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Test the conversion of path-keyed databases to the (dir_id, name) layout
+
+Both scanners convert an old database in place when they open it. This
+script checks plain, interrupted and concurrent conversions, and the
+narrower layout progressive_scanner.py creates, without running a scan.
+"""
+
+import os
+import sys
+import tempfile
+import sqlite3
+import signal
+import subprocess
+import time
+import logging
+from multiprocessing import Pool
+
+# Add current directory and the mono scanner to path
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, '..', 'mono_scanner'))
+
+from smart_scanner import SmartScanner
+import nas_scanner_hp
+import progressive_scanner
+
+LEGACY_SCHEMA = '''
+    CREATE TABLE files (
+        path TEXT PRIMARY KEY,
+        size INTEGER,
+        mtime REAL,
+        checksum TEXT,
+        mount_point TEXT,
+        file_type TEXT,
+        extension TEXT,
+        scan_time REAL
+    ) WITHOUT ROWID
+'''
+
+def create_legacy_db(db_path, rows):
+    """Write a database in the old path-keyed layout"""
+    conn = sqlite3.connect(db_path)
+    conn.execute(LEGACY_SCHEMA)
+    conn.execute('CREATE TABLE scanned_dirs (path TEXT PRIMARY KEY, mount_point TEXT, scan_time REAL) WITHOUT ROWID')
+    conn.executemany(
+        'INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+        ((f"/mnt/user/share/dir{i % 500}/file{i}.jpg", i, 0.0, None, 'share', 'photos', '.jpg', 0.0)
+         for i in range(rows))
+    )
+    conn.commit()
+    conn.close()
+
+def converted_rows(db_path):
+    """Rows in the converted files table, or None if it is still path-keyed"""
+    conn = sqlite3.connect(db_path)
+    try:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(files)')}
+        if 'path' in columns or 'files_legacy' in tables:
+            return None
+        return conn.execute('SELECT COUNT(*) FROM files_by_path').fetchone()[0]
+    finally:
+        conn.close()
+
+def legacy_rows(db_path):
+    """Rows still waiting in a path-keyed files or files_legacy table"""
+    conn = sqlite3.connect(db_path)
+    try:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(files)')}
+        count = 0
+        if 'path' in columns:
+            count += conn.execute('SELECT COUNT(*) FROM files').fetchone()[0]
+        if 'files_legacy' in tables:
+            count += conn.execute('SELECT COUNT(*) FROM files_legacy').fetchone()[0]
+        return count
+    finally:
+        conn.close()
+
+def open_mono(db_path):
+    """Open the database the way a scan container does"""
+    try:
+        nas_scanner_hp.DatabaseManager(db_path)
+        return 'ok'
+    except Exception as e:
+        return f"error: {e}"
+
+def check(ok, message):
+    print(f"{'✅' if ok else '❌'} {message}")
+    return ok
+
+def test_plain_conversion(temp_dir):
+    """Both scanners convert a legacy database completely"""
+    print("\nTEST: Plain conversion")
+    print("-" * 40)
+    results = []
+
+    db_path = os.path.join(temp_dir, 'mono.db')
+    create_legacy_db(db_path, 1000)
+    open_mono(db_path)
+    results.append(check(converted_rows(db_path) == 1000, "Mono scanner converted all 1000 rows"))
+
+    db_path = os.path.join(temp_dir, 'smart.db')
+    create_legacy_db(db_path, 1000)
+    SmartScanner(db_path, skip_analysis=True).create_scan_database()
+    results.append(check(converted_rows(db_path) == 1000, "Smart scanner converted all 1000 rows"))
+
+    conn = sqlite3.connect(db_path)
+    path = conn.execute("SELECT path FROM files_by_path WHERE size = 42").fetchone()[0]
+    stats = conn.execute("SELECT n FROM agg_stats WHERE file_type = 'photos'").fetchone()
+    conn.close()
+    results.append(check(path == '/mnt/user/share/dir42/file42.jpg', f"Full path preserved: {path}"))
+    results.append(check(stats == (1000,), f"Stats backfilled after conversion: {stats}"))
+    return all(results)
+
+def test_unfinished_conversion(temp_dir):
+    """A files_legacy table left by an interrupted older conversion is finished"""
+    print("\nTEST: Leftover files_legacy from an interrupted conversion")
+    print("-" * 40)
+    db_path = os.path.join(temp_dir, 'leftover.db')
+    create_legacy_db(db_path, 1000)
+
+    # The state the old conversion left when stopped after its DDL
+    conn = sqlite3.connect(db_path)
+    conn.execute('ALTER TABLE files RENAME TO files_legacy')
+    conn.execute('''
+        CREATE TABLE files (
+            dir_id INTEGER, name TEXT, size INTEGER, mtime REAL, checksum TEXT,
+            mount_point TEXT, file_type TEXT, extension TEXT, scan_time REAL,
+            PRIMARY KEY (dir_id, name)
+        ) WITHOUT ROWID
+    ''')
+    conn.commit()
+    conn.close()
+
+    open_mono(db_path)
+    return check(converted_rows(db_path) == 1000, "Stranded rows moved into files")
+
+def test_progressive_layout(temp_dir):
+    """The narrower files table progressive_scanner.py creates converts too"""
+    print("\nTEST: progressive_scanner layout")
+    print("-" * 40)
+    db_path = os.path.join(temp_dir, 'progressive.db')
+    progressive_scanner.DatabaseManager(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        'INSERT INTO files (path, mount_point, size, mtime, scan_time) VALUES (?, ?, ?, ?, ?)',
+        ((f"/mnt/user/share/dir{i % 50}/file{i}.jpg", 'share', i, 0.0, 0.0) for i in range(1000))
+    )
+    conn.commit()
+    conn.close()
+
+    results = [check(open_mono(db_path) == 'ok', "Mono scanner opened the progressive database")]
+    results.append(check(converted_rows(db_path) == 1000, "All 1000 rows converted"))
+
+    conn = sqlite3.connect(db_path)
+    row = conn.execute("SELECT size, checksum, file_type FROM files_by_path "
+                       "WHERE path = '/mnt/user/share/dir42/file42.jpg'").fetchone()
+    conn.close()
+    results.append(check(row == (42, None, None), f"Missing columns filled with NULL: {row}"))
+
+    # Both scanners keep working on the converted database
+    db = nas_scanner_hp.DatabaseManager(db_path)
+    db.save_files([{'path': '/mnt/user/share/new/file.jpg', 'size': 1, 'mtime': 0.0, 'mount_point': 'share',
+                    'file_type': 'photos', 'extension': '.jpg', 'scan_time': 0.0}],
+                  ['/mnt/user/share/new'], 'share')
+    progressive_scanner.DatabaseManager(db_path)
+    results.append(check(converted_rows(db_path) == 1001, "New rows saved after the conversion"))
+    return all(results)
+
+def test_killed_conversion(temp_dir):
+    """Killing a conversion part-way loses nothing"""
+    print("\nTEST: Conversion killed part-way")
+    print("-" * 40)
+    db_path = os.path.join(temp_dir, 'killed.db')
+    rows = 200000
+    create_legacy_db(db_path, rows)
+
+    child = subprocess.Popen([
+        sys.executable, '-c',
+        f"import sys; sys.path.insert(0, {os.path.join(HERE, '..', 'mono_scanner')!r}); "
+        f"import nas_scanner_hp; nas_scanner_hp.DatabaseManager({db_path!r})"
+    ], stderr=subprocess.DEVNULL)
+    time.sleep(0.3)
+    child.send_signal(signal.SIGKILL)
+    child.wait()
+
+    remaining = legacy_rows(db_path)
+    converted = converted_rows(db_path)
+    results = [check(remaining == rows or converted == rows,
+                     f"After the kill: {remaining} legacy rows, {converted} converted rows")]
+
+    open_mono(db_path)
+    results.append(check(converted_rows(db_path) == rows, f"Next start converted all {rows} rows"))
+    return all(results)
+
+def test_concurrent_conversion(temp_dir):
+    """Containers opening a legacy database at the same time all succeed"""
+    print("\nTEST: Concurrent conversion")
+    print("-" * 40)
+    db_path = os.path.join(temp_dir, 'concurrent.db')
+    rows = 200000
+    create_legacy_db(db_path, rows)
+
+    with Pool(4) as pool:
+        outcomes = pool.map(open_mono, [db_path] * 4)
+
+    results = [check(outcomes == ['ok'] * 4, f"All four inits succeeded: {outcomes}")]
+    results.append(check(converted_rows(db_path) == rows, f"All {rows} rows converted once"))
+    return all(results)
+
+if __name__ == '__main__':
+    print("Testing Legacy Database Conversion")
+    print("=" * 60)
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        results = [
+            test_plain_conversion(temp_dir),
+            test_unfinished_conversion(temp_dir),
+            test_progressive_layout(temp_dir),
+            test_killed_conversion(temp_dir),
+            test_concurrent_conversion(temp_dir),
+        ]
+
+    print("\n" + "=" * 60)
+    if all(results):
+        print("🎉 ALL TESTS PASSED - Legacy databases convert safely")
+    else:
+        print("⚠️  SOME TESTS FAILED - Legacy conversion needs fixes")
+    print("=" * 60)
+    sys.exit(0 if all(results) else 1)
@@ -15,7 +15,7 @@ from datetime import datetime
 # Add current directory to path to import smart_scanner
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from smart_scanner import setup_logging, SmartScanner
+from smart_scanner import setup_logging, SmartScanner, Chunk
 
 def test_logging():
     """Test the enhanced logging functionality"""
@@ -80,7 +80,7 @@ def test_logging():
         
         # Test _check_database_activity method
         try:
-            activity = scanner._check_database_activity({'mount_name': 'test'})
+            activity = scanner._check_database_activity(Chunk(path=temp_dir, size_gb=0, mount_name='test'))
             print("✅ Database activity check working")
         except Exception as e:
             print(f"❌ Database activity check failed: {e}")
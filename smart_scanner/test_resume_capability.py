@@ -38,12 +38,14 @@ def test_resume_capability():
         os.makedirs(subdir2)
         os.makedirs(subdir3)
         
-        # Create a few test files
+        # Create a few test files (raw fds: open, write, close and nothing else)
         for i, subdir in enumerate([subdir1, subdir2, subdir3]):
             for j in range(3):
-                test_file = os.path.join(subdir, f"file_{i}_{j}.txt")
-                with open(test_file, 'w') as f:
-                    f.write(f"Test content for file {i}_{j}")
+                fd = os.open(os.path.join(subdir, f"file_{i}_{j}.txt"), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+                try:
+                    os.write(fd, f"Test content for file {i}_{j}".encode())
+                finally:
+                    os.close(fd)
         
         db_path = os.path.join(temp_dir, "test_progressive.db")
         mount_name = "TestMount"
@@ -99,11 +101,10 @@ def test_resume_capability():
         conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
         
-        cursor.execute("SELECT COUNT(*) FROM scanned_dirs WHERE mount_point = ?", (mount_name,))
-        scanned_count = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT path FROM scanned_dirs WHERE mount_point = ?", (mount_name,))
-        scanned_paths = [row[0] for row in cursor.fetchall()]
+        # The paths are listed below anyway, so count them instead of a second query
+        scanned_paths = [row[0] for row in cursor.execute(
+            "SELECT path FROM scanned_dirs WHERE mount_point = ?", (mount_name,))]
+        scanned_count = len(scanned_paths)
         
         conn.close()
         